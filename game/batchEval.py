@@ -0,0 +1,371 @@
+import argparse
+import random
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from .engine import MIRRORED, PIECE_SQUARE_TABLES, PIECE_VALUES
+from .movegen import RAYS, generateLegalMoves, isInCheck
+from .pieces import (
+    ADVISOR_MOVES,
+    ELEPHANT_MOVES,
+    HORSE_MOVES,
+    LORD_MOVES,
+    PIECE_CLASSES,
+    SOLDIER_MOVES,
+)
+from .position import (
+    BoardState,
+    CHARIOT,
+    CANNON,
+    HORSE,
+    ELEPHANT,
+    ADVISOR,
+    LORD,
+    SOLDIER,
+    ROWS,
+    COLS,
+    SQUARES,
+    START_FEN,
+)
+from .record import decodeMove, readGames
+from .utils import RED_SIDE, BLUE_SIDE
+
+# Boards are (N, SQUARES) int8 arrays of piece codes, as BoardState.squares
+# A column is added on the right of every board which always stays empty, so
+# the moves without a square to check point to it
+EMPTY = SQUARES
+# Piece codes go from -SOLDIER to SOLDIER, tables are indexed by code + OFFSET
+OFFSET = SOLDIER
+# Boards evaluated at once, to bound the memory of the (pieces, moves) arrays
+CHUNK_SIZE = 4096
+# Most moves of a piece which does not slide, those of the horse
+MAX_LEAPS = 8
+
+BatchEvaluation = namedtuple(
+    "BatchEvaluation", ["score", "material", "position", "mobility", "inCheck"]
+)
+BatchEvaluation.__doc__ = """
+Evaluation of N boards:
+    score: material + position for the side to move as engine.evaluate, for
+    red when the turns are not given, (N,)
+    material: piece values of red minus blue, (N,)
+    position: piece-square bonuses of red minus blue, (N,)
+    mobility: pseudo-legal moves of every side, indexed by side, (N, 2)
+    inCheck: whether the lord of every side is attacked, or faces the other
+    lord, indexed by side, (N, 2)
+"""
+
+
+def _makeValueTables():
+    """
+    Value and piece-square bonus of every piece code, negative for blue
+    """
+    values = np.zeros(2 * OFFSET + 1, np.int32)
+    squareTables = np.zeros((2 * OFFSET + 1, SQUARES), np.int32)
+
+    for pieceType, value in PIECE_VALUES.items():
+        table = PIECE_SQUARE_TABLES[pieceType]
+        values[OFFSET + pieceType] = value
+        values[OFFSET - pieceType] = -value
+        squareTables[OFFSET + pieceType] = table
+        squareTables[OFFSET - pieceType] = [-table[MIRRORED[s]] for s in range(SQUARES)]
+
+    return values, squareTables
+
+
+def _makeLeaps():
+    """
+    Moves of the pieces which do not slide, indexed by code + OFFSET and square:
+    the targets and the squares which must be empty to reach them, both padded
+    with EMPTY
+    """
+    targets = np.full((2 * OFFSET + 1, SQUARES, MAX_LEAPS), EMPTY, np.intp)
+    blocks = np.full((2 * OFFSET + 1, SQUARES, MAX_LEAPS), EMPTY, np.intp)
+
+    for side, sign in ((RED_SIDE, 1), (BLUE_SIDE, -1)):
+        tables = {
+            HORSE: HORSE_MOVES,
+            ELEPHANT: ELEPHANT_MOVES[side],
+            ADVISOR: [
+                [(target, EMPTY) for target in moves] for moves in ADVISOR_MOVES[side]
+            ],
+            LORD: [[(target, EMPTY) for target in moves] for moves in LORD_MOVES[side]],
+            SOLDIER: [
+                [(target, EMPTY) for target in moves] for moves in SOLDIER_MOVES[side]
+            ],
+        }
+        for pieceType, table in tables.items():
+            for square, moves in enumerate(table):
+                for slot, (target, block) in enumerate(moves):
+                    targets[OFFSET + pieceType * sign, square, slot] = target
+                    blocks[OFFSET + pieceType * sign, square, slot] = block
+
+    return targets, blocks
+
+
+def _makeRays():
+    """
+    Squares of the 4 lines leaving every square, nearest first, padded with EMPTY
+    """
+    longest = max(len(ray) for rays in RAYS for ray in rays)
+    rays = np.full((SQUARES, len(RAYS[0]), longest), EMPTY, np.intp)
+    for square, squareRays in enumerate(RAYS):
+        for slot, ray in enumerate(squareRays):
+            rays[square, slot, : len(ray)] = ray
+    return rays
+
+
+PIECE_VALUE_BY_CODE, SQUARE_TABLES_BY_CODE = _makeValueTables()
+LEAP_TARGETS, LEAP_BLOCKS = _makeLeaps()
+RAY_SQUARES = _makeRays()
+
+
+def encodeBoards(states):
+    """
+    Pack BoardStates into a (N, SQUARES) int8 array of boards and a (N,) array
+    of the sides to move
+    """
+    states = list(states)
+    boards = np.empty((len(states), SQUARES), np.int8)
+    turns = np.empty(len(states), np.int8)
+
+    for row, state in enumerate(states):
+        boards[row] = np.frombuffer(state.squares, np.int8)
+        turns[row] = state.turn
+
+    return boards, turns
+
+
+def _perSide(count, rows, sides, values):
+    """
+    Add up values of pieces into a (count, 2) array by board and side
+    """
+    totals = np.bincount(rows * 2 + sides, weights=values, minlength=count * 2)
+    return totals.reshape(count, 2)
+
+
+def _evaluateChunk(boards):
+    """
+    Every piece of every board is handled at once, through its moves looked up
+    in the tables of its code and square
+    """
+    count = len(boards)
+    padded = np.zeros((count, SQUARES + 1), np.int8)
+    padded[:, :SQUARES] = boards
+    occupied = padded != 0
+    # Squares are read from the flattened boards, at row * (SQUARES + 1) + square
+    flatCodes = padded.ravel()
+    flatOccupied = occupied.ravel()
+
+    rows, squares = np.nonzero(boards)
+    codes = boards[rows, squares].astype(np.intp)
+    signs = np.sign(codes)
+    sides = np.where(codes > 0, RED_SIDE, BLUE_SIDE)
+    slots = codes + OFFSET
+
+    material = np.bincount(
+        rows, weights=PIECE_VALUE_BY_CODE[slots], minlength=count
+    ).astype(np.int32)
+    position = np.bincount(
+        rows, weights=SQUARE_TABLES_BY_CODE[slots, squares], minlength=count
+    ).astype(np.int32)
+
+    # Square of the lord of every side of every board, EMPTY when it is missing
+    lordSquares = np.full((count, 2), EMPTY, np.intp)
+    isLord = np.abs(codes) == LORD
+    lordSquares[rows[isLord], sides[isLord]] = squares[isLord]
+    enemyLords = lordSquares[rows, 1 - sides][:, None]
+
+    # Pieces which jump to a square or step to it
+    targets = LEAP_TARGETS[slots, squares]
+    offsets = (rows * (SQUARES + 1))[:, None]
+    valid = (
+        (targets != EMPTY)
+        & ~flatOccupied.take(offsets + LEAP_BLOCKS[slots, squares])
+        & (flatCodes.take(offsets + targets) * signs[:, None] <= 0)
+    )
+    moves = np.count_nonzero(valid, axis=1)
+    attacks = (valid & (targets == enemyLords)).any(axis=1)
+
+    # Chariots and cannons walk their 4 lines, counting the pieces passed
+    sliding = np.flatnonzero((np.abs(codes) == CHARIOT) | (np.abs(codes) == CANNON))
+    rays = RAY_SQUARES[squares[sliding]]
+    rayIndexes = offsets[sliding][:, :, None] + rays
+    rayOccupied = flatOccupied.take(rayIndexes)
+    passed = np.cumsum(rayOccupied, axis=2, dtype=np.int8) - rayOccupied
+    targetCodes = flatCodes.take(rayIndexes) * signs[sliding][:, None, None]
+
+    chariot = (np.abs(codes[sliding]) == CHARIOT)[:, None, None]
+    valid = (rays != EMPTY) & np.where(
+        chariot,
+        (passed == 0) & (targetCodes <= 0),
+        ((passed == 0) & (targetCodes == 0)) | ((passed == 1) & (targetCodes < 0)),
+    )
+    moves[sliding] += np.count_nonzero(valid.reshape(len(sliding), -1), axis=1)
+    attacks[sliding] |= (valid & (rays == enemyLords[sliding][:, :, None])).any(
+        axis=(1, 2)
+    )
+
+    mobility = _perSide(count, rows, sides, moves).astype(np.int32)
+    attacked = _perSide(count, rows, 1 - sides, attacks) > 0
+
+    # The lords can not face each other on an open file
+    redLord = lordSquares[:, RED_SIDE]
+    blueLord = lordSquares[:, BLUE_SIDE]
+    both = (redLord != EMPTY) & (blueLord != EMPTY)
+    column = np.where(both, redLord % COLS, 0)
+    file = occupied[:, :SQUARES].reshape(count, ROWS, COLS)[np.arange(count), :, column]
+    fileRows = np.arange(ROWS)
+    between = (fileRows > (blueLord // COLS)[:, None]) & (
+        fileRows < (redLord // COLS)[:, None]
+    )
+    facing = both & (redLord % COLS == blueLord % COLS) & ~(file & between).any(axis=1)
+
+    hasLord = lordSquares != EMPTY
+    inCheck = hasLord & (attacked | facing[:, None])
+
+    return material, position, mobility, inCheck
+
+
+def evaluateBatch(boards, turns=None):
+    """
+    Evaluate many boards at once with array operations
+    boards: (N, SQUARES) int8 array of piece codes, see encodeBoards
+    turns: (N,) sides to move, to score the boards for the side to move
+    Return a BatchEvaluation
+    """
+    boards = np.asarray(boards, np.int8).reshape(-1, SQUARES)
+    chunks = [
+        _evaluateChunk(boards[start : start + CHUNK_SIZE])
+        for start in range(0, len(boards), CHUNK_SIZE)
+    ] or [_evaluateChunk(boards)]
+    material, position, mobility, inCheck = (
+        np.concatenate(parts) for parts in zip(*chunks)
+    )
+
+    score = material + position
+    if turns is not None:
+        score = np.where(np.asarray(turns) == RED_SIDE, score, -score)
+
+    return BatchEvaluation(score, material, position, mobility, inCheck)
+
+
+def evaluateOne(state):
+    """
+    Same values as evaluateBatch for a single BoardState, one piece at a time
+    Return (score for the side to move, material, position, mobility, inCheck)
+    """
+    squares = state.squares
+    material = position = 0
+    mobility = [0, 0]
+
+    for side in (RED_SIDE, BLUE_SIDE):
+        sign = 1 if side == RED_SIDE else -1
+        for square in state.pieceSquares[side]:
+            pieceType = squares[square] * sign
+            table = PIECE_SQUARE_TABLES[pieceType]
+            material += sign * PIECE_VALUES[pieceType]
+            position += sign * table[square if side == RED_SIDE else MIRRORED[square]]
+            mobility[side] += len(
+                PIECE_CLASSES[pieceType].generateMoves(state, square, side)
+            )
+
+    score = material + position
+    inCheck = [isInCheck(state, BLUE_SIDE), isInCheck(state, RED_SIDE)]
+    return (
+        score if state.turn == RED_SIDE else -score,
+        material,
+        position,
+        mobility,
+        inCheck,
+    )
+
+
+def collectPositions(paths, count, seed=0):
+    """
+    Gather up to count positions from the games of record files, or from random
+    games when no file is given
+    """
+    start = BoardState.fromFen(START_FEN)
+    states = []
+
+    for path in paths:
+        for record in readGames(path):
+            state = start.copy()
+            for code in record.moves:
+                move = decodeMove(code)
+                if move not in generateLegalMoves(state):
+                    break
+                state.makeMove(*move)
+                states.append(state.copy())
+                if len(states) >= count:
+                    return states
+
+    rng = random.Random(seed)
+    while not paths and len(states) < count:
+        state = start.copy()
+        for _ in range(200):
+            moves = generateLegalMoves(state)
+            if not moves or len(states) >= count:
+                break
+            state.makeMove(*rng.choice(moves))
+            states.append(state.copy())
+
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate positions in bulk and compare with one at a time"
+    )
+    parser.add_argument(
+        "records", nargs="*", help="record files, random games if none is given"
+    )
+    parser.add_argument("--positions", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    states = collectPositions(args.records, args.positions, args.seed)
+    if not states:
+        print("no position to evaluate")
+        return 1
+
+    startTime = time.perf_counter()
+    boards, turns = encodeBoards(states)
+    encodeTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    result = evaluateBatch(boards, turns)
+    batchTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    expected = [evaluateOne(state) for state in states]
+    loopTime = time.perf_counter() - startTime
+
+    mismatches = sum(
+        1
+        for row, (score, material, position, mobility, inCheck) in enumerate(expected)
+        if score != result.score[row]
+        or material != result.material[row]
+        or position != result.position[row]
+        or mobility != list(result.mobility[row])
+        or inCheck != list(result.inCheck[row])
+    )
+
+    print(f"{len(states)} positions, {mismatches} mismatches")
+    print(
+        f"batch: {batchTime:.3f}s ({len(states) / batchTime:.0f} positions/s), "
+        f"encoding {encodeTime:.3f}s"
+    )
+    print(
+        f"one at a time: {loopTime:.3f}s ({len(states) / loopTime:.0f} positions/s), "
+        f"{loopTime / batchTime:.1f}x slower"
+    )
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
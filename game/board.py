@@ -1,13 +1,50 @@
-import pygame
 import os
-import numpy as np
 
-from .pieces import Chariot, Cannon, Horse, Elephant, Soldier, Advisor, Lord
-from .utils import Color, RED_SIDE, BLUE_SIDE, WIN_HEIGHT, WIN_WIDTH
+from .pieces import Lord, PIECE_CLASSES
+from .movegen import MoveCache, isInCheck
+from .position import (
+    BoardState,
+    CHARIOT,
+    CANNON,
+    HORSE,
+    ELEPHANT,
+    ADVISOR,
+    LORD,
+    SOLDIER,
+    SQUARES,
+    makeCode,
+    otherSide,
+    parseFen,
+    sideOf,
+    toPosition,
+    toSquare,
+)
+from .tablebase import Tablebase
+from .utils import RED_SIDE, BLUE_SIDE, WIN_HEIGHT, WIN_WIDTH
+
+# Names of the piece types in preset files
+PIECE_NAMES = {
+    CHARIOT: "chariot",
+    CANNON: "cannon",
+    HORSE: "horse",
+    ELEPHANT: "elephant",
+    SOLDIER: "soldier",
+    ADVISOR: "advisor",
+    LORD: "lord",
+}
+PIECE_TYPES = {name: pieceType for pieceType, name in PIECE_NAMES.items()}
+
+# Starting positions already read, see BoardGame.startTemplate
+_templates = {}
+# Positions from FEN strings are kept too, up to this many
+MAX_TEMPLATES = 256
+
+# Tables of the tablebase directory, opened on the first probe
+_tablebase = None
 
 
 class BoardGame:
-    def __init__(self):
+    def __init__(self, presetPath=None, fen=None):
         self.rows = 9
         self.cols = 8
 
@@ -17,38 +54,42 @@ class BoardGame:
         self.width = self.cols * self.gap
         self.height = self.rows * self.gap
 
-        # contains info of all postions in the board
-        self.grid = [[None for _ in range(self.cols + 1)] for _ in range(self.rows + 1)]
+        # compact state of the board, the source of truth for the rules
+        self.state = BoardState()
+        # piece objects drawing the state, indexed by square
+        self.pieceViews = [None] * SQUARES
         # contains all active pieces all the board
         self.activePices = []
         # contains all movable positions
         self.movables = []
-        # info of which side's turn
-        self.turn = RED_SIDE
         # Varible contain to LORD pieces of either side
         self.blueLord = None
         self.redLord = None
 
         self.calculatePostion()
-        self.makeGrid()
+        self.makeGrid(presetPath, fen)
+
+    @property
+    def turn(self):
+        """
+        Info of which side's turn
+        """
+        return self.state.turn
 
     def addNewPiece(self, type, position, side):
         """
         Add new piece to the board
         Help set up the board
         """
-        chessTypes = {
-            "chariot": Chariot,
-            "cannon": Cannon,
-            "horse": Horse,
-            "elephant": Elephant,
-            "soldier": Soldier,
-            "advisor": Advisor,
-            "lord": Lord,
-        }
+        newPiece = self.addPieceView(type, position, side)
+        self.state.addPiece(makeCode(newPiece.TYPE, side), toSquare(position))
 
+    def addPieceView(self, type, position, side):
+        """
+        Make the piece object of a piece already in the state
+        """
         centrePoint = self.getCoordinateFromPosition(position)
-        newPiece = chessTypes.get(type)(
+        newPiece = PIECE_CLASSES[PIECE_TYPES[type]](
             centrePoint=centrePoint, position=position, side=side
         )
         self.activePices.append(newPiece)
@@ -59,15 +100,22 @@ class BoardGame:
             else:
                 self.blueLord = newPiece
 
-        row, col = position
-        self.grid[row][col] = newPiece
+        self.pieceViews[toSquare(position)] = newPiece
+        return newPiece
 
-    def readPreset(self):
-        directory = os.path.dirname(__file__)
-        presetPath = os.path.join(directory, "presets/standard.cfg")
+    def readPreset(self, presetPath=None):
+        """
+        Read the pieces of a preset file, the standard one if no path is given
+        A file ending with .fen holds a FEN string instead of one piece per line
+        """
+        if presetPath is None:
+            directory = os.path.dirname(__file__)
+            presetPath = os.path.join(directory, "presets/standard.cfg")
         seperator = " ******** "
 
         with open(presetPath, "r") as f:
+            if presetPath.endswith(".fen"):
+                return self.readFen(f.read())
             lines = f.readlines()
 
         result = []
@@ -83,98 +131,86 @@ class BoardGame:
 
             result.append((piece, position, side))
 
-        return result
+        return result, RED_SIDE
 
-    def makeGrid(self):
+    def readFen(self, fen):
         """
-        Set up all the pieces and their positions in the board at the beginning of the game
+        Read the pieces and the side to move of a FEN string
+        Return (pieces, turn) like readPreset, raise ValueError for an invalid FEN
         """
-        pieces = self.readPreset()
+        squares, turn = parseFen(fen)
 
-        for piece, position, side in pieces:
-            self.addNewPiece(piece, position, side)
+        result = []
+        for square, code in enumerate(squares):
+            if code:
+                result.append(
+                    (PIECE_NAMES[abs(code)], toPosition(square), sideOf(code))
+                )
 
-        # Check all possible move for all the pieces after initialize the board
-        for piece in self.activePices:
-            piece.checkPossibleMove(self.grid)
+        return result, turn
 
-    def drawGrid(self, win):
+    def startTemplate(self, presetPath=None, fen=None):
         """
-        Draw the chess board
+        Get the pieces and the state of a starting position, read and checked
+        only the first time it is asked for
         """
+        key = (presetPath, fen)
+        template = _templates.get(key)
+        if template is not None:
+            return template
 
-        riverCoordinate = ()
+        if fen is not None:
+            pieces, turn = self.readFen(fen)
+        else:
+            pieces, turn = self.readPreset(presetPath)
 
-        # Draw all the lines
-        for row in range(self.rows + 1):
-            pygame.draw.line(
-                win,
-                Color.GREY,
-                (self.x, self.y + row * self.gap),
-                (self.x + self.width, self.y + row * self.gap),
-                2,
-            )
+        state = BoardState()
+        for piece, position, side in pieces:
+            state.addPiece(makeCode(PIECE_TYPES[piece], side), toSquare(position))
+        state.setTurn(turn)
 
-            if row == self.rows // 2:
-                riverCoordinate = (self.x + 2, self.y + row * self.gap + 2)
+        # The side which just moved can not have its lord under attack
+        if isInCheck(state, otherSide(turn)):
+            raise ValueError("the side not to move is in check")
 
-            for col in range(self.cols + 1):
-                pygame.draw.line(
-                    win,
-                    Color.GREY,
-                    (col * self.gap + self.x, self.y),
-                    (col * self.gap + self.x, self.height + self.y),
-                    2,
-                )
+        if len(_templates) >= MAX_TEMPLATES:
+            _templates.clear()
+        template = _templates[key] = (tuple(pieces), state)
+        return template
 
-        # Draw the palace
-        palaceCoors = [
-            (
-                (self.x + self.gap * 3, self.y),
-                (self.x + self.gap * 5, self.y + self.gap * 2),
-            ),
-            (
-                (self.x + self.gap * 5, self.y),
-                (self.x + self.gap * 3, self.y + self.gap * 2),
-            ),
-            (
-                (self.x + self.gap * 3, self.y + self.gap * 7),
-                (self.x + self.gap * 5, self.y + self.gap * 9),
-            ),
-            (
-                (self.x + self.gap * 5, self.y + self.gap * 7),
-                (self.x + self.gap * 3, self.y + self.gap * 9),
-            ),
-        ]
-        for point1, point2 in palaceCoors:
-            pygame.draw.line(win, Color.GREY, point1, point2, 2)
-
-        # Draw the river
-        pygame.draw.rect(
-            win,
-            Color.BLACK,
-            pygame.Rect(*riverCoordinate, self.width - 2, self.gap - 2),
-        )
+    def makeGrid(self, presetPath=None, fen=None):
+        """
+        Set up all the pieces and their positions in the board at the beginning of the game
+        fen: FEN string of the position, used instead of the preset file if given
+        """
+        pieces, state = self.startTemplate(presetPath, fen)
 
-        # Draw the border
-        self.rectangle = pygame.draw.rect(
-            win,
-            Color.WHITE,
-            (
-                self.x - self.border,
-                self.y - self.border,
-                self.width + self.border * 2,
-                self.height + self.border * 2,
-            ),
-            2,
-        )
+        for piece, position, side in pieces:
+            self.addPieceView(piece, position, side)
+        self.state = state.copy()
+        # Moves of every piece, only those a move changes are generated again
+        self.moveCache = MoveCache(self.state)
 
+        # Check all possible move for all the pieces after initialize the board
         for piece in self.activePices:
-            piece.draw(win)
+            piece.possibleMoves = [
+                toPosition(square) for square in self.moveCache.movesFrom(piece.square)
+            ]
+
+    def toFen(self):
+        """
+        Write the position as a FEN string
+        """
+        return self.state.toFen()
+
+    def drawGrid(self, win):
+        """
+        Draw the chess board
+        """
+        # Imported here so the board can be used without pygame
+        from .render import drawBoard
 
-        for position in self.movables:
-            coor = self.getCoordinateFromPosition(position)
-            pygame.draw.circle(win, Color.GREEN, coor, 7)
+        drawBoard(win, self)
 
     def calculatePostion(self):
         """
@@ -213,8 +249,26 @@ class BoardGame:
         """
         Get piece from given location
         """
-        row, col = position
-        return self.grid[row][col]
+        return self.pieceViews[toSquare(position)]
+
+    def positionKey(self):
+        """
+        Return the 64 bits Zobrist key of the current position, side to move included
+        """
+        return self.state.key
+
+    def probeTablebase(self, tablebase=None):
+        """
+        Look up the current position in the endgame tablebases
+        Return (result, plies to mate) for the side to move, result being WIN,
+        DRAW or LOSS of game/tablebase.py, None if no table covers the material
+        """
+        global _tablebase
+        if tablebase is None:
+            if _tablebase is None:
+                _tablebase = Tablebase()
+            tablebase = _tablebase
+        return tablebase.probe(self.state)
 
     def getLord(self, side):
         """
@@ -253,48 +307,71 @@ class BoardGame:
     def movePiece(self, oldPos, newPos=(0, 0)):
         """
         Moving the piece and update the board
+        Return the undo record of the move
         """
+        self.deselectPiece(oldPos)
 
-        lordPiece = self.getLord(side=self.turn)
-        lordPiece.mated = False
+        return self.makeMove(oldPos, newPos)
 
-        oldRow, oldCol = oldPos
-        newRow, newCol = newPos
+    def makeMove(self, oldPos, newPos):
+        """
+        Play a move on the board in place, without any copy
+        Return the (fromSq, toSq, captured) record which unmakeMove uses to take
+        the move back, captured being the code of the captured piece or 0
+        """
+        oldSquare = toSquare(oldPos)
+        newSquare = toSquare(newPos)
 
-        self.deselectPiece(oldPos)
+        movingPiece = self.pieceViews[oldSquare]
+        capturedPiece = self.pieceViews[newSquare]
+
+        self.getLord(side=self.turn).mated = False
+        record = self.moveCache.makeMove(oldSquare, newSquare)
 
         # Capture a piece if there is one in a new pos
-        if self.grid[newRow][newCol]:
-            self.activePices.remove(self.grid[newRow][newCol])
+        if capturedPiece:
+            self.activePices.remove(capturedPiece)
 
         # Swap piece's position to new position
-        movingPiece = self.grid[oldRow][oldCol]
-        self.grid[oldRow][oldCol] = None
-        self.grid[newRow][newCol] = movingPiece
+        self.pieceViews[oldSquare] = None
+        self.pieceViews[newSquare] = movingPiece
 
         newCentrePoint = self.getCoordinateFromPosition(newPos)
         movingPiece.moveToNewSpot(centrePoint=newCentrePoint, position=newPos)
 
-        # Swich turn
-        self.turn = RED_SIDE if self.turn == BLUE_SIDE else BLUE_SIDE
+        return record
 
-    def lordTolord(self):
+    def unmakeMove(self, record):
         """
-        Check if 2 lords are directly look at each other, which is an invalid move
+        Take back a move made by makeMove
+        A captured piece gets a new piece object, and no lord is left marked as
+        under attack, whoever plays next checks its own lord again
         """
-        row1, col1 = self.redLord.getPosition()
-        row2, col2 = self.blueLord.getPosition()
-
-        if col1 == col2:
-            up = max(row1, row2)
-            down = min(row1, row2)
-
-            column = np.array(self.grid)[:, col1]
+        oldSquare, newSquare, captured = record
+        self.moveCache.unmakeMove(record)
+
+        movingPiece = self.pieceViews[newSquare]
+        self.pieceViews[oldSquare] = movingPiece
+        self.pieceViews[newSquare] = None
+
+        oldPos = toPosition(oldSquare)
+        oldCentrePoint = self.getCoordinateFromPosition(oldPos)
+        movingPiece.moveToNewSpot(centrePoint=oldCentrePoint, position=oldPos)
+
+        if captured:
+            newPos = toPosition(newSquare)
+            capturedPiece = PIECE_CLASSES[abs(captured)](
+                centrePoint=self.getCoordinateFromPosition(newPos),
+                position=newPos,
+                side=sideOf(captured),
+            )
+            self.activePices.append(capturedPiece)
+            self.pieceViews[newSquare] = capturedPiece
 
-            for index in range(down + 1, up):
-                if column[index] is not None:
-                    return False
+        self.redLord.mated = self.blueLord.mated = False
 
-            return True
-        else:
-            return False
+    def lordTolord(self):
+        """
+        Check if 2 lords are directly look at each other, which is an invalid move
+        """
+        return self.state.lordsFacing()
@@ -0,0 +1,208 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from collections import Counter
+
+from .movegen import generateLegalMoves
+from .position import BoardState, START_FEN, toPosition
+from .record import (
+    BLUE_WON,
+    RED_WON,
+    decodeMove,
+    encodeMove,
+    readGames,
+    toIccs,
+)
+from .utils import RED_SIDE
+
+# A book file is MAGIC followed by entries sorted by position key then move:
+#   (64 bits Zobrist key of the position, 16 bits move, 16 bits weight)
+# the move being encoded as in record files, see game/record.py
+MAGIC = b"XQB1"
+ENTRY = struct.Struct("<QHH")
+KEY = struct.Struct("<Q")
+
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+    """
+    Opening book read through mmap, only the pages touched by a lookup are
+    loaded, so opening a book of any size is instant
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = None
+        if os.fstat(self.file.fileno()).st_size < len(MAGIC):
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+        self.size = (len(self.data) - len(MAGIC)) // ENTRY.size
+
+    def __len__(self):
+        return self.size
+
+    def keyAt(self, index):
+        return KEY.unpack_from(self.data, len(MAGIC) + index * ENTRY.size)[0]
+
+    def lookup(self, key):
+        """
+        Get the book moves of a position as ((fromSq, toSq), weight) pairs
+        """
+        # First entry whose key is not smaller than the given one
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.keyAt(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        for index in range(low, self.size):
+            entryKey, move, weight = ENTRY.unpack_from(
+                self.data, len(MAGIC) + index * ENTRY.size
+            )
+            if entryKey != key:
+                break
+            moves.append((decodeMove(move), weight))
+
+        return moves
+
+    def bestMove(self, key):
+        """
+        Get the (fromSq, toSq) played the most from the position, None if it is
+        not in the book
+        """
+        moves = self.lookup(key)
+        if not moves:
+            return None
+        return max(moves, key=lambda entry: entry[1])[0]
+
+    def chooseMove(self, key, rng=random):
+        """
+        Pick a book move of the position at random, following the weights
+        Return its (fromSq, toSq), None if the position is not in the book
+        """
+        moves = [(move, weight) for move, weight in self.lookup(key) if weight]
+        if not moves:
+            return None
+        return rng.choices(
+            [move for move, _ in moves], weights=[weight for _, weight in moves]
+        )[0]
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def recordPaths(directory):
+    """
+    Get the record files of a directory, see game/record.py
+    """
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".xqr")
+    )
+
+
+def buildBook(paths, maxPlies=20, minCount=1):
+    """
+    Count the moves of the first maxPlies plies of every game of the record files
+    A move is worth 2 when the side playing it went on to win, 1 otherwise
+    Moves played fewer than minCount times are left out
+    Return the sorted (key, move, weight) entries of the book
+    """
+    start = BoardState.fromFen(START_FEN)
+    weights = Counter()
+    counts = Counter()
+
+    for path in paths:
+        for record in readGames(path):
+            state = start.copy()
+
+            for code in record.moves[:maxPlies]:
+                move = decodeMove(code)
+                if move not in generateLegalMoves(state):
+                    break
+
+                won = (record.result == RED_WON and state.turn == RED_SIDE) or (
+                    record.result == BLUE_WON and state.turn != RED_SIDE
+                )
+                entry = (state.key, encodeMove(*move))
+                counts[entry] += 1
+                weights[entry] += 2 if won else 1
+
+                state.makeMove(*move)
+
+    return sorted(
+        (key, move, min(weights[key, move], MAX_WEIGHT))
+        for (key, move), count in counts.items()
+        if count >= minCount
+    )
+
+
+def writeBook(path, entries):
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or read an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="compile a book from recorded games")
+    build.add_argument("directory", help="directory of the .xqr record files")
+    build.add_argument("book", help="book file to write")
+    build.add_argument("--plies", type=int, default=20)
+    build.add_argument("--min-count", type=int, default=2)
+
+    probe = commands.add_parser("probe", help="show the book moves of a position")
+    probe.add_argument("book")
+    probe.add_argument("--fen", default=START_FEN)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        entries = buildBook(recordPaths(args.directory), args.plies, args.min_count)
+        writeBook(args.book, entries)
+        print(
+            f"{len(entries)} moves in {len({key for key, _, _ in entries})} positions"
+        )
+        return 0
+
+    state = BoardState.fromFen(args.fen)
+    with OpeningBook(args.book) as book:
+        moves = sorted(book.lookup(state.key), key=lambda entry: -entry[1])
+        for (fromSq, toSq), weight in moves:
+            print(
+                f"{toIccs(fromSq, toSq)} {toPosition(fromSq)} -> {toPosition(toSq)}: {weight}"
+            )
+        if not moves:
+            print("position not in the book")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
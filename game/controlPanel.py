@@ -1,5 +1,9 @@
 import pygame
 
+from .engine import nodesPerSecond
+from .position import toSquare
+from .record import toIccs
+from .render import TextCache, prepareSurface
 from .utils import ChessImages, Color, Font, RED_SIDE, BLUE_SIDE, WIN_HEIGHT, WIN_WIDTH
 
 
@@ -8,7 +12,8 @@ class ControlPanel:
 
     def __init__(self, game):
         self.width = 250
-        self.height = 600
+        # The move statistics overlay is drawn under the buttons
+        self.height = 800
 
         self.x = WIN_WIDTH - self.width - self.MARGIN_RIGHT
         self.y = 50
@@ -16,12 +21,16 @@ class ControlPanel:
         self.game = game
 
         self.buttons = []
+        self.buttonImages = {}
+        self.texts = TextCache()
 
         self.makeIndicators()
         self.makeButton(self.x, self.y + 200, "Undo")
         self.makeButton(self.x + self.width - 100, self.y + 200, "Reset")
         self.makeButton(self.x, self.y + 300, "New Room")
         self.makeButton(self.x + self.width - 100, self.y + 300, "Join Room")
+        self.makeButton(self.x, self.y + 400, "Computer")
+        self.makeButton(self.x + self.width - 100, self.y + 400, "Redo")
 
     def makeIndicators(self):
         """
@@ -32,10 +41,28 @@ class ControlPanel:
 
         self.indicatorRadius = 35
         self.indicators = [
-            (self.blueLord, (self.x + 35, self.y + 35)),
-            (self.redLord, (self.x + self.width - 35, self.y + 35)),
+            (self.makeIndicatorImage(self.blueLord), (self.x + 35, self.y + 35)),
+            (
+                self.makeIndicatorImage(self.redLord),
+                (self.x + self.width - 35, self.y + 35),
+            ),
         ]
 
+    def makeIndicatorImage(self, lordImage):
+        """
+        Draw the lord on its white circle once, so drawing an indicator is one blit
+        """
+        size = self.indicatorRadius * 2
+        image = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(
+            image,
+            Color.WHITE,
+            (self.indicatorRadius, self.indicatorRadius),
+            self.indicatorRadius,
+        )
+        image.blit(lordImage, (0, 0))
+        return prepareSurface(image)
+
     def makeButton(self, x, y, text):
         """
         Make sure every button is the same size
@@ -48,6 +75,14 @@ class ControlPanel:
 
         self.buttons.append((coordinate, width, height, text))
 
+        # The label is drawn on the button once
+        image = pygame.Surface((width, height))
+        image.fill(Color.WHITE)
+        label = Font.WRITING_FONT.render(text, True, Color.BLACK)
+        textWidth, textHeight = label.get_size()
+        image.blit(label, ((width - textWidth) // 2, (height - textHeight) // 2))
+        self.buttonImages[text] = prepareSurface(image)
+
     def runCommand(self, buttonText):
         # if buttonText == "Undo":
         #     self.game.undo()
@@ -55,7 +90,14 @@ class ControlPanel:
         # elif buttonText == "Reset":
         #     self.game.resetGame()
 
-        FUNCTIONS = {"Undo": self.game.undo, "Reset": self.game.resetGame}
+        FUNCTIONS = {
+            "Undo": self.game.undo,
+            "Redo": self.game.redo,
+            "Reset": self.game.resetGame,
+            "Computer": self.game.toggleComputer,
+            "New Room": self.game.newRoom,
+            "Join Room": self.game.joinRoom,
+        }
 
         FUNCTIONS[buttonText]()
 
@@ -81,7 +123,6 @@ class ControlPanel:
         Draw the control panel
         """
         for indicator, centrePoint in self.indicators:
-            pygame.draw.circle(win, Color.WHITE, centrePoint, self.indicatorRadius)
             win.blit(
                 indicator,
                 (
@@ -91,24 +132,63 @@ class ControlPanel:
             )
 
         for coordinate, width, height, text in self.buttons:
-            text = Font.WRITING_FONT.render(text, True, Color.BLACK)
-            textWidth, textHeight = text.get_size()
-            pygame.draw.rect(
-                win,
+            win.blit(self.buttonImages[text], coordinate)
+
+        if self.game.lastSearch is not None:
+            search = self.game.lastSearch
+            text = self.texts.render(
+                Font.SCORE_TEXT_FONT,
+                f"Depth {search.depth}  {nodesPerSecond(search)} nps",
                 Color.WHITE,
-                pygame.Rect(*coordinate, width, height),
             )
-            textX = coordinate[0] + (width - textWidth) // 2
-            textY = coordinate[1] + (height - textHeight) // 2
+            textX = self.x + (self.width - text.get_width()) // 2
+            win.blit(text, (textX, self.y + 100))
+
+        if self.game.room is not None:
+            side = "Red" if self.game.onlineSide == RED_SIDE else "Blue"
+            status = "playing" if self.game.roomStarted else "waiting"
+            text = self.texts.render(
+                Font.SCORE_TEXT_FONT,
+                f"Room {self.game.room}  {side}  {status}",
+                Color.WHITE,
+            )
+            textX = self.x + (self.width - text.get_width()) // 2
+            win.blit(text, (textX, self.y + 500))
+
+        if self.game.bookHint is not None:
+            fromPos, toPos = self.game.bookHint
+            text = self.texts.render(
+                Font.SCORE_TEXT_FONT,
+                f"Book {toIccs(toSquare(fromPos), toSquare(toPos))}",
+                Color.WHITE,
+            )
+            textX = self.x + (self.width - text.get_width()) // 2
+            win.blit(text, (textX, self.y + 550))
 
-            win.blit(text, (textX, textY))
+        if self.game.stats.visible:
+            textY = self.y + 600
+            for line in self.game.stats.overlayLines():
+                text = self.texts.render(Font.STATS_FONT, line, Color.WHITE)
+                textX = self.x + (self.width - text.get_width()) // 2
+                win.blit(text, (textX, textY))
+                textY += text.get_height()
 
         if self.game.isOver:
-            winnerTeam = "Blue" if self.game.turn == RED_SIDE else "Red"
-            text = Font.NORMAL_FONT.render(f"{winnerTeam} won", True, Color.GREEN)
+            if self.game.winner is None:
+                banner = "Draw"
+            else:
+                banner = "Red won" if self.game.winner == RED_SIDE else "Blue won"
+            text = self.texts.render(Font.NORMAL_FONT, banner, Color.GREEN)
             textWidth, textHeight = text.get_size()
 
             textX = self.x + (self.width - textWidth) // 2
             textY = 150
 
             win.blit(text, (textX, textY))
+
+            if self.game.endReason is not None:
+                text = self.texts.render(
+                    Font.SCORE_TEXT_FONT, self.game.endReason, Color.WHITE
+                )
+                textX = self.x + (self.width - text.get_width()) // 2
+                win.blit(text, (textX, textY + textHeight))
@@ -0,0 +1,425 @@
+import argparse
+import multiprocessing
+import queue
+import time
+from collections import namedtuple
+
+from .movegen import generateLegalMoves, isInCheck
+from .pieces import PIECE_CLASSES
+from .position import (
+    BoardState,
+    CHARIOT,
+    CANNON,
+    HORSE,
+    ELEPHANT,
+    ADVISOR,
+    LORD,
+    SOLDIER,
+    COLS,
+    SQUARES,
+)
+from .utils import RED_SIDE, BLUE_SIDE
+
+# Scores are in hundredths of a soldier, a mate is worth MATE minus its distance
+MATE = 100000
+INFINITY = MATE + 1
+
+PIECE_VALUES = {
+    CHARIOT: 900,
+    CANNON: 450,
+    HORSE: 400,
+    ELEPHANT: 200,
+    ADVISOR: 200,
+    LORD: 0,
+    SOLDIER: 100,
+}
+
+
+def _makeSquareTable(bonusOf):
+    """
+    Build a piece-square table seen from the red side, whose palace is at the bottom
+    bonusOf: gives the bonus of a row and a column
+    """
+    return tuple(bonusOf(*divmod(square, COLS)) for square in range(SQUARES))
+
+
+def _soldierBonus(row, col):
+    if row > 4:  # Not crossed the river yet
+        return 0
+    centre = 4 - abs(col - 4)
+    return 80 + 10 * centre - 10 * abs(row - 2) if row > 0 else 20
+
+
+def _centreBonus(row, col):
+    return 4 * (4 - abs(col - 4)) + 2 * min(row, 9 - row)
+
+
+# Positional bonus of every piece type on every square, for the red side
+PIECE_SQUARE_TABLES = {
+    CHARIOT: _makeSquareTable(lambda row, col: 2 * (4 - abs(col - 4))),
+    CANNON: _makeSquareTable(lambda row, col: 10 if col == 4 else 0),
+    HORSE: _makeSquareTable(_centreBonus),
+    ELEPHANT: _makeSquareTable(lambda row, col: 0),
+    ADVISOR: _makeSquareTable(lambda row, col: 0),
+    LORD: _makeSquareTable(lambda row, col: -10 * (9 - row)),
+    SOLDIER: _makeSquareTable(_soldierBonus),
+}
+
+# Flip a square upside down to read the tables for the blue side
+MIRRORED = tuple(
+    (9 - square // COLS) * COLS + square % COLS for square in range(SQUARES)
+)
+
+# Flags of the entries of the transposition table
+EXACT, LOWER_BOUND, UPPER_BOUND = range(3)
+
+# Result of a search, the move is a (fromSq, toSq) pair of the searched position
+SearchResult = namedtuple(
+    "SearchResult", ["key", "move", "score", "depth", "nodes", "elapsed"]
+)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(state):
+    """
+    Score the position for the side to move, from material and piece-square tables
+    """
+    squares = state.squares
+    score = 0
+
+    for square in state.pieceSquares[RED_SIDE]:
+        pieceType = squares[square]
+        score += PIECE_VALUES[pieceType] + PIECE_SQUARE_TABLES[pieceType][square]
+
+    for square in state.pieceSquares[BLUE_SIDE]:
+        pieceType = -squares[square]
+        score -= (
+            PIECE_VALUES[pieceType] + PIECE_SQUARE_TABLES[pieceType][MIRRORED[square]]
+        )
+
+    return score if state.turn == RED_SIDE else -score
+
+
+def nodesPerSecond(result):
+    return int(result.nodes / result.elapsed) if result.elapsed else 0
+
+
+class Engine:
+    """
+    Negamax alpha-beta search with iterative deepening under a time budget,
+    quiescence on captures and a transposition table of a fixed size
+    """
+
+    def __init__(self, tableSize=1 << 18):
+        # Transposition table entries are (key, depth, score, flag, move)
+        self.table = [None] * tableSize
+        self.tableMask = tableSize - 1
+        self.killers = {}
+
+        self.nodes = 0
+        self.deadline = None
+
+    def search(self, state, timeLimit=2.0, maxDepth=64, onIteration=None):
+        """
+        Find the best move of the side to move within timeLimit seconds
+        onIteration: called with the SearchResult of every completed depth
+        """
+        startTime = time.perf_counter()
+        self.deadline = startTime + timeLimit
+        self.nodes = 0
+        self.killers = {}
+
+        # A timeout leaves the moves of the current line on the board, so the
+        # search plays on its own copy of the position
+        state = BoardState.fromSquares(state.squares, state.turn)
+
+        moves = generateLegalMoves(state)
+        result = SearchResult(
+            key=state.key,
+            move=moves[0] if moves else None,
+            score=0 if moves else -MATE,
+            depth=0,
+            nodes=0,
+            elapsed=0.0,
+        )
+
+        for depth in range(1, maxDepth + 1):
+            try:
+                score = self._negamax(state, depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                break
+
+            entry = self.table[state.key & self.tableMask]
+            result = SearchResult(
+                key=state.key,
+                move=entry[4] if entry and entry[0] == state.key else result.move,
+                score=score,
+                depth=depth,
+                nodes=self.nodes,
+                elapsed=time.perf_counter() - startTime,
+            )
+
+            if onIteration:
+                onIteration(result)
+
+            # No need to look further once a mate is found
+            if abs(score) >= MATE - depth:
+                break
+
+        return result._replace(
+            nodes=self.nodes, elapsed=time.perf_counter() - startTime
+        )
+
+    def _probe(self, key):
+        entry = self.table[key & self.tableMask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def _store(self, key, depth, score, flag, move, ply):
+        index = key & self.tableMask
+        entry = self.table[index]
+
+        # Keep the deeper entry of the same position
+        if entry is not None and entry[0] == key and entry[1] > depth:
+            return
+
+        # Mate scores are stored relative to the position, not to the root
+        if score >= MATE - 1000:
+            score += ply
+        elif score <= -MATE + 1000:
+            score -= ply
+
+        self.table[index] = (key, depth, score, flag, move)
+
+    def _orderMoves(self, state, moves, tableMove, ply):
+        """
+        Table move first, then captures by most valuable victim / least valuable
+        attacker, then the killer moves of this ply
+        """
+        squares = state.squares
+        killers = self.killers.get(ply, ())
+
+        def priority(move):
+            if move == tableMove:
+                return 1 << 20
+            victim = squares[move[1]]
+            if victim:
+                return (
+                    10000
+                    + 10 * PIECE_VALUES[abs(victim)]
+                    - PIECE_VALUES[abs(squares[move[0]])]
+                )
+            if move in killers:
+                return 5000
+            return 0
+
+        moves.sort(key=priority, reverse=True)
+        return moves
+
+    def _negamax(self, state, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023 and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+        key = state.key
+        tableMove = None
+        entry = self._probe(key)
+        if entry is not None:
+            tableMove = entry[4]
+            if entry[1] >= depth and ply > 0:
+                score = entry[2]
+                if score >= MATE - 1000:
+                    score -= ply
+                elif score <= -MATE + 1000:
+                    score += ply
+
+                flag = entry[3]
+                if flag == EXACT:
+                    return score
+                if flag == LOWER_BOUND and score >= beta:
+                    return score
+                if flag == UPPER_BOUND and score <= alpha:
+                    return score
+
+        inCheck = isInCheck(state, state.turn)
+        if inCheck:
+            depth += 1
+
+        if depth <= 0:
+            return self._quiesce(state, alpha, beta, ply)
+
+        moves = generateLegalMoves(state)
+        if not moves:
+            # Checkmate and stalemate are both lost in chinese chess
+            return -MATE + ply
+
+        originalAlpha = alpha
+        bestScore = -INFINITY
+        bestMove = None
+
+        for move in self._orderMoves(state, moves, tableMove, ply):
+            record = state.makeMove(*move)
+            score = -self._negamax(state, depth - 1, -beta, -alpha, ply + 1)
+            state.unmakeMove(record)
+
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+
+            if score > alpha:
+                alpha = score
+
+            if alpha >= beta:
+                if not state.squares[move[1]]:
+                    killers = self.killers.setdefault(ply, [])
+                    if move not in killers:
+                        killers.insert(0, move)
+                        del killers[2:]
+                break
+
+        if bestScore <= originalAlpha:
+            flag = UPPER_BOUND
+        elif bestScore >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self._store(key, depth, bestScore, flag, bestMove, ply)
+
+        return bestScore
+
+    def _quiesce(self, state, alpha, beta, ply):
+        """
+        Only look at captures until the position is quiet
+        """
+        self.nodes += 1
+        if not self.nodes & 1023 and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+        standPat = evaluate(state)
+        if standPat >= beta:
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+
+        side = state.turn
+        squares = state.squares
+        sign = 1 if side == RED_SIDE else -1
+
+        captures = []
+        for square in state.pieceSquares[side]:
+            attacker = PIECE_VALUES[squares[square] * sign]
+            for target in PIECE_CLASSES[squares[square] * sign].generateMoves(
+                state, square, side
+            ):
+                if squares[target]:
+                    victim = PIECE_VALUES[-squares[target] * sign]
+                    captures.append((10 * victim - attacker, square, target))
+
+        captures.sort(reverse=True)
+
+        for _, square, target in captures:
+            record = state.makeMove(square, target)
+            if isInCheck(state, side):
+                state.unmakeMove(record)
+                continue
+
+            score = -self._quiesce(state, -beta, -alpha, ply + 1)
+            state.unmakeMove(record)
+
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        return alpha
+
+
+def _workerLoop(requests, results):
+    """
+    Entry point of the engine process: search every position sent by EngineWorker
+    """
+    engine = Engine()
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+
+        squares, turn, timeLimit = request
+        state = BoardState.fromSquares(squares, turn)
+        results.put(engine.search(state, timeLimit=timeLimit))
+
+
+class EngineWorker:
+    """
+    Run the engine in its own process, so the game window keeps rendering while
+    the engine is thinking
+    """
+
+    def __init__(self, timeLimit=2.0):
+        self.timeLimit = timeLimit
+        self.thinking = False
+
+        context = multiprocessing.get_context("spawn")
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(
+            target=_workerLoop, args=(self.requests, self.results), daemon=True
+        )
+        self.process.start()
+
+    def search(self, state):
+        """
+        Start searching the given position, the result comes back through poll
+        """
+        self.requests.put((state.squares, state.turn, self.timeLimit))
+        self.thinking = True
+
+    def poll(self):
+        """
+        Return the SearchResult once the engine is done, without blocking
+        """
+        if not self.thinking:
+            return None
+
+        try:
+            result = self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+        self.thinking = False
+        return result
+
+    def stop(self):
+        self.requests.put(None)
+        self.process.join(timeout=1)
+
+
+def main():
+    """
+    Search the starting position and print the throughput of every depth
+    """
+    from .board import BoardGame
+
+    parser = argparse.ArgumentParser(description="Chinese chess engine benchmark")
+    parser.add_argument("--time", type=float, default=5.0, help="seconds to search")
+    args = parser.parse_args()
+
+    def report(result):
+        print(
+            f"depth {result.depth:2d}  score {result.score:6d}  "
+            f"nodes {result.nodes:9d}  nps {nodesPerSecond(result):7d}  "
+            f"move {result.move}"
+        )
+
+    state = BoardGame().state
+    result = Engine().search(state, timeLimit=args.time, onIteration=report)
+    print(f"total nodes {result.nodes}  nps {nodesPerSecond(result)}")
+
+
+if __name__ == "__main__":
+    main()
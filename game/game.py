@@ -1,13 +1,53 @@
-from copy import deepcopy
+import os
 from pprint import pprint
 
-from .utils import RED_TURN, BLUE_TURN
+from .utils import DEFAULT_HOST, DEFAULT_PORT, RED_TURN, BLUE_TURN
 from .board import BoardGame
+from .book import OpeningBook
+from .journal import MoveJournal, FLAG_CHECK
+from .movegen import generateLegalMoves, hasAnyLegalMove, isInCheck, legalTargets
+from .position import otherSide, toPosition, toSquare
+from .record import RecordWriter, resultOf, toIccs
+from .repetition import (
+    NO_MOVE_LEFT,
+    REPETITION_LIMIT,
+    PositionHistory,
+)
+from .stats import MoveStats
 
 
 class Game:
-    def __init__(self, win):
+    def __init__(self, win=None, fen=None):
+        # Window to draw the game on, None to play without a window
         self.win = win
+        # FEN of the starting position, None for the standard one
+        self.startFen = fen
+        # Side played by the engine, None when both sides are played by humans
+        self.computerSide = None
+
+        # Opening book suggesting moves from the standard start, see openBook
+        self.book = None
+
+        # Record file every finished or abandoned game is added to, None to not
+        # keep the games
+        self.recordPath = None
+
+        # Online play, see newRoom and joinRoom
+        self.serverAddress = (DEFAULT_HOST, DEFAULT_PORT)
+        self.client = None
+        # Side played on this window and code of the room, None when offline
+        self.onlineSide = None
+        self.room = None
+        self.roomStarted = False
+        # Message sent to the server once the client is connected, and whether
+        # to start a server in this process if it can not connect, see connect
+        self.pendingRequest = None
+        self.hostIfMissing = False
+
+        # Counters and timings of every move played on this window, kept over
+        # new games, see game/stats.py
+        self.stats = MoveStats()
+
         self._init()
 
     def updateGame(self):
@@ -17,41 +57,285 @@ class Game:
         """
         Initilize new board
         """
-        self.board = BoardGame()
-        self.tempBoard = self.board
+        self.board = BoardGame(fen=self.startFen)
+        # Every move of the game, for undo and redo
+        self.journal = MoveJournal()
+        # Every position of the game, to end it on repetitions
+        self.history = PositionHistory(self.board.positionKey())
         self.gameover = False
-        self.turn = RED_TURN
+        # Side which won, None for a draw or while the game goes on
+        self.winner = None
+        # Why the game ended, see game/repetition.py
+        self.endReason = None
+        self.turn = self.board.turn
         self.selectedPiece = None
-        self.enemyPieces = []
+        # Last search of the engine, shown in the control panel
+        self.lastSearch = None
+        # Most played book move of the position, shown in the control panel
+        self.bookHint = None
+        self.updateBookHint()
 
     @property
     def isOver(self):
         return self.gameover
 
+    @property
+    def isOnline(self):
+        return self.onlineSide is not None
+
     def resetGame(self):
         """
-        Reset the game
+        Reset the game, leaving the room when playing online
         """
+        self.saveGame()
+        self.leaveRoom()
         self._init()
 
+    def saveGame(self):
+        """
+        Add the moves of the game to the record file, if there are any
+        Records always start from the standard position, other games are not kept
+        """
+        if self.recordPath is None or self.startFen is not None:
+            return
+        if not len(self.journal):
+            return
+
+        directory = os.path.dirname(self.recordPath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with RecordWriter(self.recordPath) as writer:
+            writer.write(self.journal.moves(), resultOf(self))
+
     def undo(self):
         """
-        Undo a move
+        Take back the last move, as many times as there are moves
+        When playing against the computer, its reply is taken back too
+        """
+        if self.isOnline or not self.journal.canUndo():
+            return
+
+        self.clearSelection()
+
+        fromSq, toSq, captured, _ = self.journal.undo()
+        self.board.unmakeMove((fromSq, toSq, captured))
+        self.history.pop()
+        self.gameover = False
+        self.winner = self.endReason = None
+        self.nextTurn()
+
+        if self.isComputerTurn() and self.journal.canUndo():
+            self.undo()
+
+    def redo(self):
+        """
+        Play again the last move taken back by undo
+        When playing against the computer, its reply is played again too
+        """
+        if self.isOnline or not self.journal.canRedo():
+            return
+
+        self.clearSelection()
+
+        fromSq, toSq, _, flags = self.journal.redo()
+        self.board.makeMove(toPosition(fromSq), toPosition(toSq))
+        self.nextTurn()
+        self.recordPosition(flags)
+
+        if self.isComputerTurn() and self.journal.canRedo():
+            self.redo()
+
+    def openBook(self, path):
+        """
+        Use the opening book of the given file, see game/book.py
+        """
+        if self.book is not None:
+            self.book.close()
+        self.book = OpeningBook(path)
+        self.updateBookHint()
+
+    def bookMove(self, best=False):
+        """
+        Get a book move of the position as (fromPos, toPos), a random one following
+        the weights of the book or the most played one if best is set
+        None without a book, out of the book or away from the standard start
+        """
+        if self.book is None or self.startFen is not None or self.isOver:
+            return None
+
+        key = self.board.positionKey()
+        move = self.book.bestMove(key) if best else self.book.chooseMove(key)
+        if move is None:
+            return None
+        return toPosition(move[0]), toPosition(move[1])
+
+    def updateBookHint(self):
+        self.bookHint = self.bookMove(best=True)
+
+    def clearSelection(self):
+        """
+        Deselect the selected piece, if there is one
+        """
+        if self.selectedPiece is not None:
+            self.board.deselectPiece(self.selectedPiece.getPosition())
+            self.selectedPiece = None
+
+    def toggleComputer(self):
+        """
+        Let the engine play the blue side, or give it back to a human player
+        """
+        if self.isOnline:
+            return
+
+        self.computerSide = BLUE_TURN if self.computerSide is None else None
+
+    def connect(self, request, hostIfMissing=False):
+        """
+        Start connecting to the room server at serverAddress without waiting,
+        pollNetwork sends the request once connected
+        request: message to send to the server
+        hostIfMissing: start a server in this process if there is none
+        """
+        # Imported here so games which never go online do not load asyncio
+        from .roomClient import RoomClient
+
+        self.leaveRoom()
+
+        self.client = RoomClient(*self.serverAddress)
+        self.pendingRequest = request
+        self.hostIfMissing = hostIfMissing
+
+    def newRoom(self):
+        """
+        Open a room on the server and wait for an opponent, playing red
+        """
+        self.connect({"type": "create"}, hostIfMissing=True)
+
+    def joinRoom(self):
+        """
+        Join the oldest room which waits for an opponent
+        """
+        self.connect({"type": "join"})
+
+    def leaveRoom(self):
+        if self.client is not None:
+            self.client.send({"type": "leave"})
+            self.client.close()
+
+        self.client = None
+        self.onlineSide = None
+        self.room = None
+        self.roomStarted = False
+        self.pendingRequest = None
+
+    def pollNetwork(self):
+        """
+        Handle the messages of the room server, called by the game loop
+        Return True if there was any, the window may have to be drawn again
+        """
+        if self.client is None:
+            return False
+
+        messages = self.client.poll()
+        for message in messages:
+            kind = message["type"]
+
+            if kind == "connected":
+                self.client.send(self.pendingRequest)
+                self.pendingRequest = None
+
+            elif kind == "failed":
+                self.connectionFailed(message["reason"])
+                return True
+
+            elif kind == "joined":
+                self.saveGame()
+                self._init()
+                self.computerSide = None
+                self.onlineSide = message["side"]
+                self.room = message["room"]
+
+            elif kind == "start":
+                self.roomStarted = True
+
+            elif kind == "move" and self.isOnline:
+                self.playMove(tuple(message["from"]), tuple(message["to"]))
+
+            elif kind == "left":
+                print("The opponent left the room")
+                self.leaveRoom()
+                return True
+
+            elif kind == "error":
+                print(f"Room server: {message['reason']}")
+
+        return bool(messages)
+
+    def connectionFailed(self, reason):
+        """
+        Start a server in this process and connect to it if connect asked for
+        one, otherwise give up
+        """
+        from .roomClient import RoomClient
+        from .roomServer import startLoopbackServer
+
+        client, self.client = self.client, None
+        if self.hostIfMissing:
+            self.hostIfMissing = False
+            try:
+                address = startLoopbackServer(*self.serverAddress)
+            except OSError as error:
+                reason = str(error)
+            else:
+                self.client = RoomClient(*address)
+                return
+
+        print(f"Cannot reach the room server: {reason}")
+        self.pendingRequest = None
+        client.close()
+
+    def isRemoteTurn(self):
+        """
+        Check if the board waits for a move from the other side of the room
+        """
+        return self.isOnline and (not self.roomStarted or self.turn != self.onlineSide)
+
+    def isComputerTurn(self):
+        return not self.isOver and self.turn == self.computerSide
+
+    def playMove(self, fromPos, toPos):
+        """
+        Play a move which does not come from clicks on the board, such as the engine's one
         """
+        if self.selectedPiece is not None:
+            self.board.deselectPiece(self.selectedPiece.getPosition())
 
-        if not self.isOver:
-            self.board.deselectPiece(self.selectedPiece.position)
-            self.board = self.tempBoard
-            self.turn = self.board.turn
+        self.selectPiece(self.board.getPiece(fromPos))
+
+        return self.move(toPos)
+
+    def selectPiece(self, piece):
+        """
+        Select a piece of the side to move and show where it can go, the legal
+        moves of a piece are only generated once it is selected
+        """
+        self.selectedPiece = piece
+        piece.makeSelected()
+        with self.stats.timer("selectPiece"):
+            piece.possibleMoves = [
+                toPosition(square)
+                for square in legalTargets(
+                    self.board.state, piece.square, self.board.moveCache
+                )
+            ]
+        self.board.movables = piece.possibleMoves
 
     def switchTurn(self):
         """
         Switching side
         """
         self.turn = RED_TURN if self.turn == BLUE_TURN else BLUE_TURN
-        self.enemyPieces = [
-            piece for piece in self.board.activePices if piece.side != self.turn
-        ]
 
     def checkForMove(self, clickedPos):
         """
@@ -64,9 +348,7 @@ class Game:
 
             if not self.selectedPiece:
                 if piece is not None and piece.side == self.board.turn:
-                    self.selectedPiece = piece
-                    self.selectedPiece.makeSelected()
-                    self.board.movables = self.selectedPiece.possibleMoves
+                    self.selectPiece(piece)
 
             else:
                 if piece == self.selectedPiece:
@@ -93,66 +375,85 @@ class Game:
         position: args tuple
         """
         if postion in self.board.movables:
-            self.tempBoard = deepcopy(self.board)
-            self.board.movePiece(self.selectedPiece.position, postion)
+            side = self.turn
+            oldPos = self.selectedPiece.position
+            record = self.board.movePiece(oldPos, postion)
             self.selectedPiece = None
-            self.switchTurn()
-            self.checkForMated()
+            self.nextTurn()
+
+            flags = FLAG_CHECK if self.board.getLord(self.turn).mated else 0
+            self.journal.record(*record, flags=flags)
+            self.recordPosition(flags)
+            self.stats.endMove(toIccs(toSquare(oldPos), toSquare(postion)))
 
-            if self.calculateNextMoves() == 0:
-                self.gameover = True
+            # Moves of this window are sent to the room, the server checks them
+            if self.isOnline and side == self.onlineSide:
+                self.client.send({"type": "move", "from": oldPos, "to": postion})
 
             return True
         else:
             print(f"Cant move there {postion}")
             return False
 
+    def nextTurn(self):
+        """
+        Hand the board to the other side after a move was played or taken back
+        """
+        self.switchTurn()
+        with self.stats.timer("checkForMated"):
+            self.checkForMated()
+
+        with self.stats.timer("gameOver"):
+            noMoveLeft = not hasAnyLegalMove(self.board.state, self.board.moveCache)
+        if noMoveLeft:
+            self.endGame(otherSide(self.turn), NO_MOVE_LEFT)
+
+        self.updateBookHint()
+
+    def recordPosition(self, flags):
+        """
+        Add the position reached by the last move to the history, ending the
+        game once it was reached REPETITION_LIMIT times
+        flags: journal flags of the move
+        """
+        if self.history.push(self.board.positionKey(), flags) < REPETITION_LIMIT:
+            return
+        if not self.gameover:
+            moves = [move[:3] for move in self.journal.moves()]
+            self.endGame(*self.history.judge(self.board.state, moves))
+
+    def endGame(self, winner, reason):
+        """
+        winner: side which won, None for a draw
+        """
+        self.gameover = True
+        self.winner = winner
+        self.endReason = reason
+
     def checkForMated(self):
         """
         Check if the lord is under attack
         """
         lordPiece = self.board.getLord(self.turn)
-        enemyMoves = []
-        for p in self.enemyPieces:
-            enemyMoves += p.checkPossibleMove(self.board.grid)
-
-        lordPiece.mated = True if tuple(lordPiece.position) in enemyMoves else False
+        lordPiece.mated = isInCheck(self.board.state, self.turn)
 
     def calculateNextMoves(self):
         """
         Calcalate the next moves for every piece
+        Moves are otherwise only generated for the selected piece, see selectPiece
         """
-        piecesInTurn = [
-            piece for piece in self.board.activePices if piece.side == self.turn
-        ]  # get all pieces that in the turn to move
-
-        nextMoves = 0
-
-        totalPiecesCheck = 0
-
-        for piece in piecesInTurn:
-            moves = piece.checkPossibleMove(self.board.grid)
-            validMoves = []
-
-            for move in moves:
-                tempBoard = deepcopy(self.board)
-                tempPiece = tempBoard.getPiece(piece.getPosition())
-
-                tempBoard.movePiece(tempPiece.position, move)
-                lordPiece = tempBoard.getLord(self.turn)
-
-                enemyMoves = []
-                for p in tempBoard.activePices:
-                    if p.getSide() != self.turn and p.attackingPiece:
-                        enemyMoves += p.checkPossibleMove(tempBoard.grid)
-                        totalPiecesCheck += 1
+        with self.stats.timer("calculateNextMoves"):
+            piecesInTurn = [
+                piece for piece in self.board.activePices if piece.side == self.turn
+            ]  # get all pieces that in the turn to move
 
-                if tuple(lordPiece.position) in enemyMoves or tempBoard.lordTolord():
-                    continue
+            for piece in piecesInTurn:
+                piece.possibleMoves = []
 
-                validMoves.append(move)
+            legalMoves = generateLegalMoves(self.board.state, self.board.moveCache)
 
-            nextMoves += len(validMoves)
-            piece.possibleMoves = validMoves
+            for source, target in legalMoves:
+                piece = self.board.pieceViews[source]
+                piece.possibleMoves.append(toPosition(target))
 
-        return nextMoves
+        return len(legalMoves)
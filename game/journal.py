@@ -0,0 +1,103 @@
+from array import array
+
+from .position import SOLDIER
+
+# A move of the journal is packed into 32 bits:
+#   bits 0-6: square the piece moves from
+#   bits 7-13: square the piece moves to
+#   bits 14-17: code of the captured piece plus SOLDIER, SOLDIER if nothing is taken
+#   bits 18 and up: flags
+SQUARE_BITS = 7
+SQUARE_MASK = (1 << SQUARE_BITS) - 1
+CAPTURED_SHIFT = SQUARE_BITS * 2
+CAPTURED_MASK = 0xF
+FLAGS_SHIFT = CAPTURED_SHIFT + 4
+
+# The move gives check
+FLAG_CHECK = 1
+
+
+def packMove(fromSq, toSq, captured=0, flags=0):
+    """
+    Pack a move into a single integer
+    captured: code of the captured piece, 0 if nothing is taken
+    """
+    return (
+        fromSq
+        | toSq << SQUARE_BITS
+        | (captured + SOLDIER) << CAPTURED_SHIFT
+        | flags << FLAGS_SHIFT
+    )
+
+
+def unpackMove(entry):
+    """
+    Return the (fromSq, toSq, captured, flags) of a packed move
+    """
+    return (
+        entry & SQUARE_MASK,
+        entry >> SQUARE_BITS & SQUARE_MASK,
+        (entry >> CAPTURED_SHIFT & CAPTURED_MASK) - SOLDIER,
+        entry >> FLAGS_SHIFT,
+    )
+
+
+class MoveJournal:
+    """
+    Every move of a game, 4 bytes a move
+    Undo and redo only move a cursor, recording a new move drops the undone ones
+    """
+
+    def __init__(self):
+        self.entries = array("I")
+        # Number of moves on the board, the entries after it can be redone
+        self.cursor = 0
+
+    def __len__(self):
+        return self.cursor
+
+    def record(self, fromSq, toSq, captured=0, flags=0):
+        """
+        Add a move played on the board
+        """
+        del self.entries[self.cursor :]
+        self.entries.append(packMove(fromSq, toSq, captured, flags))
+        self.cursor += 1
+
+    def canUndo(self):
+        return self.cursor > 0
+
+    def canRedo(self):
+        return self.cursor < len(self.entries)
+
+    def undo(self):
+        """
+        Step back, return the (fromSq, toSq, captured, flags) of the move to take back
+        """
+        if not self.canUndo():
+            return None
+
+        self.cursor -= 1
+        return unpackMove(self.entries[self.cursor])
+
+    def redo(self):
+        """
+        Step forward, return the (fromSq, toSq, captured, flags) of the move to play again
+        """
+        if not self.canRedo():
+            return None
+
+        self.cursor += 1
+        return unpackMove(self.entries[self.cursor - 1])
+
+    def moves(self):
+        """
+        Get the moves on the board, oldest first
+        """
+        return [unpackMove(entry) for entry in self.entries[: self.cursor]]
+
+    def lastMove(self):
+        """
+        Get the last move on the board, None at the start of the game
+        """
+        return unpackMove(self.entries[self.cursor - 1]) if self.cursor else None
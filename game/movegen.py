@@ -0,0 +1,412 @@
+from .pieces import PIECE_CLASSES
+from .position import (
+    CHARIOT,
+    CANNON,
+    HORSE,
+    ELEPHANT,
+    ADVISOR,
+    LORD,
+    SOLDIER,
+    ROWS,
+    COLS,
+    SQUARES,
+    otherSide,
+    sideOf,
+)
+from .stats import COUNTERS
+from .utils import RED_SIDE
+
+
+def _onBoard(row, col):
+    return 0 <= row < ROWS and 0 <= col < COLS
+
+
+def _makeTables():
+    """
+    Geometry around every square, used to find the pieces that may attack it
+    """
+    rays = []
+    horseOrigins = []
+    diagonals = []
+    elephantOrigins = []
+
+    for square in range(SQUARES):
+        row, col = divmod(square, COLS)
+
+        squareRays = []
+        for dRow, dCol in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            ray = []
+            r, c = row + dRow, col + dCol
+            while _onBoard(r, c):
+                ray.append(r * COLS + c)
+                r, c = r + dRow, c + dCol
+            squareRays.append(tuple(ray))
+        rays.append(tuple(squareRays))
+
+        # A horse on (row + dRow, col + dCol) reaching this square has its leg
+        # on the diagonal neighbour (row + legRow, col + legCol)
+        origins = []
+        for dRow, dCol in (
+            (-2, -1),
+            (-2, 1),
+            (2, -1),
+            (2, 1),
+            (-1, -2),
+            (1, -2),
+            (-1, 2),
+            (1, 2),
+        ):
+            if not _onBoard(row + dRow, col + dCol):
+                continue
+            legRow = dRow // 2 if abs(dRow) == 2 else dRow
+            legCol = dCol // 2 if abs(dCol) == 2 else dCol
+            origins.append(
+                ((row + dRow) * COLS + col + dCol, (row + legRow) * COLS + col + legCol)
+            )
+        horseOrigins.append(tuple(origins))
+
+        diagonals.append(
+            tuple(
+                (row + dRow) * COLS + col + dCol
+                for dRow, dCol in ((-1, -1), (-1, 1), (1, -1), (1, 1))
+                if _onBoard(row + dRow, col + dCol)
+            )
+        )
+        elephantOrigins.append(
+            tuple(
+                (row + dRow) * COLS + col + dCol
+                for dRow, dCol in ((-2, -2), (-2, 2), (2, -2), (2, 2))
+                if _onBoard(row + dRow, col + dCol)
+            )
+        )
+
+    return tuple(rays), tuple(horseOrigins), tuple(diagonals), tuple(elephantOrigins)
+
+
+RAYS, HORSE_ORIGINS, DIAGONALS, ELEPHANT_ORIGINS = _makeTables()
+
+
+def _makeAffected():
+    """
+    Pieces which may get other moves when a square is emptied or filled, as
+    (square, piece types) pairs for every square:
+        the square itself, whatever stands on it
+        chariots and cannons along its lines, as a target or a screen
+        horses, lords and soldiers next to it, as a target or a horse leg
+        advisors and elephants on its diagonals, as a target or an elephant eye
+        horses and elephants a jump away, as a target
+    """
+    affected = []
+    for square in range(SQUARES):
+        types = {}
+        for ray in RAYS[square]:
+            for other in ray:
+                types.setdefault(other, set()).update((CHARIOT, CANNON))
+            if ray:
+                types[ray[0]].update((HORSE, LORD, SOLDIER))
+        for other in DIAGONALS[square]:
+            types.setdefault(other, set()).update((ADVISOR, ELEPHANT))
+        for origin, _ in HORSE_ORIGINS[square]:
+            types.setdefault(origin, set()).add(HORSE)
+        for origin in ELEPHANT_ORIGINS[square]:
+            types.setdefault(origin, set()).add(ELEPHANT)
+        types[square] = set(PIECE_CLASSES)
+
+        affected.append(
+            tuple((other, frozenset(pieceTypes)) for other, pieceTypes in types.items())
+        )
+    return tuple(affected)
+
+
+AFFECTED_PIECES = _makeAffected()
+
+
+class MoveCache:
+    """
+    Pseudo-legal moves of every piece of a BoardState, kept from one move to the
+    next. A move only forgets the moves of the pieces it may change, see
+    AFFECTED_PIECES, which are generated again when asked for
+    Moves must be played and taken back through the cache to keep it right
+    """
+
+    def __init__(self, state):
+        self.state = state
+        # Targets of the piece on every square, None until they are generated
+        self.moves = [None] * SQUARES
+        # (square, targets) forgotten by every move played, for unmakeMove
+        self.forgotten = []
+
+    def movesFrom(self, square):
+        """
+        Get the squares the piece on the given square can move to
+        """
+        moves = self.moves[square]
+        if moves is None:
+            code = self.state.squares[square]
+            moves = self.moves[square] = tuple(
+                PIECE_CLASSES[abs(code)].generateMoves(self.state, square, sideOf(code))
+            )
+            COUNTERS["pseudoMoves"] += len(moves)
+        return moves
+
+    def makeMove(self, fromSq, toSq):
+        """
+        Play a move on the state, see BoardState.makeMove
+        """
+        record = self.state.makeMove(fromSq, toSq)
+        squares = self.state.squares
+        moves = self.moves
+
+        forgotten = []
+        for changed in (fromSq, toSq):
+            for square, pieceTypes in AFFECTED_PIECES[changed]:
+                if abs(squares[square]) in pieceTypes:
+                    forgotten.append((square, moves[square]))
+                    moves[square] = None
+        self.forgotten.append(forgotten)
+
+        return record
+
+    def unmakeMove(self, record):
+        """
+        Take back the last move played with makeMove, along with the moves of the
+        pieces it made the cache forget
+        """
+        self.state.unmakeMove(record)
+        moves = self.moves
+        for square, targets in reversed(self.forgotten.pop()):
+            moves[square] = targets
+
+
+def attackersOf(state, square, bySide):
+    """
+    Get the squares of the pieces of bySide that can move to the given square
+    Candidates are found from the geometry around the square, and each of them
+    is confirmed by the move rule of its piece
+    """
+    squares = state.squares
+    sign = 1 if bySide == RED_SIDE else -1
+    candidates = []
+
+    for ray in RAYS[square]:
+        screened = False
+        for distance, other in enumerate(ray):
+            code = squares[other] * sign
+            if not code:
+                continue
+
+            if not screened:
+                if code == CHARIOT or (distance == 0 and code in (SOLDIER, LORD)):
+                    candidates.append(other)
+                screened = True
+            else:
+                if code == CANNON:
+                    candidates.append(other)
+                break
+
+    for origin, leg in HORSE_ORIGINS[square]:
+        if squares[origin] * sign == HORSE and not squares[leg]:
+            candidates.append(origin)
+
+    for other in DIAGONALS[square]:
+        if squares[other] * sign == ADVISOR:
+            candidates.append(other)
+
+    for other in ELEPHANT_ORIGINS[square]:
+        if squares[other] * sign == ELEPHANT:
+            candidates.append(other)
+
+    return [
+        other
+        for other in candidates
+        if square
+        in PIECE_CLASSES[squares[other] * sign].generateMoves(state, other, bySide)
+    ]
+
+
+def isAttacked(state, square, bySide):
+    """
+    Check if any piece of bySide can move to the given square
+    """
+    return len(attackersOf(state, square, bySide)) > 0
+
+
+def isInCheck(state, side):
+    """
+    Check if the lord of the given side is under attack, including flying lords
+    """
+    lordSquare = state.lordSquares[side]
+    return state.lordsFacing() or isAttacked(state, lordSquare, otherSide(side))
+
+
+def lordLines(state, side):
+    """
+    Find the squares around the lord of the given side where a move may change
+    whether the lord is safe, computed once per position
+
+    Return (sensitive, screens):
+        sensitive: the 4 lines from the lord (chariots, cannons, soldiers and the
+            flying lord), its diagonal neighbours (horse legs) and the squares a
+            horse attacks it from
+        screens: empty squares between the lord and an enemy cannon with nothing
+            in between, where any piece would become the screen of the cannon
+    """
+    squares = state.squares
+    lordSquare = state.lordSquares[side]
+    enemySign = -1 if side == RED_SIDE else 1
+
+    sensitive = set(DIAGONALS[lordSquare])
+    screens = set()
+
+    for ray in RAYS[lordSquare]:
+        sensitive.update(ray)
+
+        for index, other in enumerate(ray):
+            if squares[other]:
+                if squares[other] * enemySign == CANNON:
+                    screens.update(ray[:index])
+                break
+
+    for origin, _ in HORSE_ORIGINS[lordSquare]:
+        sensitive.add(origin)
+
+    return sensitive, screens
+
+
+def generateLegalMoves(state, cache=None):
+    """
+    Get all legal moves of the side to move as (fromSq, toSq) pairs
+    cache: MoveCache of the state, to reuse the moves of the pieces which did not
+    change since the last call
+
+    Pseudo-legal moves come from the rules of the pieces. Only moves of the lord,
+    moves touching the lord lines and check evasions are played and probed,
+    every other move is decided from the lord lines alone
+    """
+    side = state.turn
+    squares = state.squares
+    sign = 1 if side == RED_SIDE else -1
+    lordSquare = state.lordSquares[side]
+
+    sensitive, screens = lordLines(state, side)
+    inCheck = isInCheck(state, side)
+
+    legalMoves = []
+    # Counted here and added to COUNTERS once, this runs in the engine search
+    generated = probes = 0
+    for square in sorted(state.pieceSquares[side]):
+        if cache is not None:
+            targets = cache.movesFrom(square)
+        else:
+            targets = PIECE_CLASSES[squares[square] * sign].generateMoves(
+                state, square, side
+            )
+            generated += len(targets)
+
+        if square != lordSquare and square not in sensitive:
+            if not inCheck:
+                legalMoves.extend((square, t) for t in targets if t not in screens)
+                continue
+
+            # A piece away from the lord lines can only get out of check by
+            # landing on them
+            targets = [t for t in targets if t in sensitive]
+
+        probes += len(targets)
+        for target in targets:
+            record = state.makeMove(square, target)
+            isSafe = not isInCheck(state, side)
+            state.unmakeMove(record)
+
+            if isSafe:
+                legalMoves.append((square, target))
+
+    COUNTERS["pseudoMoves"] += generated
+    COUNTERS["probes"] += probes
+    return legalMoves
+
+
+def _legalityContext(state):
+    """
+    What deciding whether moves of the side to move are legal needs, computed
+    once per position: (side, lord square, sensitive, screens, in check)
+    """
+    side = state.turn
+    sensitive, screens = lordLines(state, side)
+    return side, state.lordSquares[side], sensitive, screens, isInCheck(state, side)
+
+
+def _isLegal(state, context, square, target):
+    """
+    Check a pseudo-legal move the same way generateLegalMoves does
+    """
+    side, lordSquare, sensitive, screens, inCheck = context
+
+    if square != lordSquare and square not in sensitive:
+        if not inCheck:
+            return target not in screens
+        if target not in sensitive:
+            return False
+
+    COUNTERS["probes"] += 1
+    record = state.makeMove(square, target)
+    isSafe = not isInCheck(state, side)
+    state.unmakeMove(record)
+    return isSafe
+
+
+def _pseudoMoves(state, square, cache):
+    if cache is not None:
+        return cache.movesFrom(square)
+    code = state.squares[square]
+    moves = PIECE_CLASSES[abs(code)].generateMoves(state, square, sideOf(code))
+    COUNTERS["pseudoMoves"] += len(moves)
+    return moves
+
+
+def iterLegalMoves(state, cache=None):
+    """
+    Yield the legal moves of the side to move as (fromSq, toSq) pairs, one at a
+    time and in 2 stages: every capture first, then the quiet moves. A caller
+    which stops early does not pay for the moves it did not ask for
+    The state must not change while the moves are iterated
+    """
+    context = _legalityContext(state)
+    squares = state.squares
+    pieces = sorted(state.pieceSquares[state.turn])
+    # Pseudo-legal moves of the pieces, generated by the first stage as needed
+    targetsOf = {}
+
+    for captures in (True, False):
+        for square in pieces:
+            targets = targetsOf.get(square)
+            if targets is None:
+                targets = targetsOf[square] = _pseudoMoves(state, square, cache)
+
+            for target in targets:
+                if (squares[target] != 0) == captures and _isLegal(
+                    state, context, square, target
+                ):
+                    yield square, target
+
+
+def hasAnyLegalMove(state, cache=None):
+    """
+    Check if the side to move has a legal move, stopping at the first one found
+    """
+    for _ in iterLegalMoves(state, cache):
+        return True
+    return False
+
+
+def legalTargets(state, square, cache=None):
+    """
+    Get the squares the piece on the given square can legally move to, for the
+    side to move
+    """
+    context = _legalityContext(state)
+    return [
+        target
+        for target in _pseudoMoves(state, square, cache)
+        if _isLegal(state, context, square, target)
+    ]
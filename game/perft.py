@@ -0,0 +1,115 @@
+import argparse
+import os
+import sys
+import time
+
+from .board import BoardGame
+from .movegen import generateLegalMoves
+from .position import START_FEN, toPosition
+
+# Known leaf counts of positions, checked against to catch move generation bugs
+# Keys are the names of the preset files or FEN strings, values map a depth to its
+# node count
+STANDARD_PERFT = {
+    1: 44,
+    2: 1920,
+    3: 79666,
+    4: 3290240,
+    5: 133312995,
+}
+KNOWN_PERFT = {
+    "standard.cfg": STANDARD_PERFT,
+    "standard.fen": STANDARD_PERFT,
+    START_FEN: STANDARD_PERFT,
+}
+
+
+def perft(state, depth):
+    """
+    Count the leaf nodes of the legal move tree of the given depth
+    """
+    if depth == 0:
+        return 1
+
+    moves = generateLegalMoves(state)
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        record = state.makeMove(*move)
+        nodes += perft(state, depth - 1)
+        state.unmakeMove(record)
+
+    return nodes
+
+
+def divide(state, depth):
+    """
+    Count the leaf nodes below every legal move of the position
+    Return a list of (move, nodes)
+    """
+    result = []
+    for move in generateLegalMoves(state):
+        record = state.makeMove(*move)
+        result.append((move, perft(state, depth - 1)))
+        state.unmakeMove(record)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Count and time the legal move tree of a position"
+    )
+    parser.add_argument("depth", type=int, nargs="?", default=3)
+    parser.add_argument(
+        "--preset", default=None, help="preset file of the position (standard.cfg)"
+    )
+    parser.add_argument("--fen", default=None, help="FEN of the position")
+    parser.add_argument(
+        "--divide", action="store_true", help="show the node count of every move"
+    )
+    args = parser.parse_args()
+
+    if args.fen is not None:
+        known = KNOWN_PERFT.get(args.fen, {})
+    else:
+        presetName = os.path.basename(args.preset) if args.preset else "standard.cfg"
+        known = KNOWN_PERFT.get(presetName, {})
+    state = BoardGame(args.preset, fen=args.fen).state
+
+    if args.divide:
+        total = 0
+        for (fromSquare, toSquare), nodes in divide(state, args.depth):
+            print(f"{toPosition(fromSquare)} -> {toPosition(toSquare)}: {nodes}")
+            total += nodes
+        print(f"total: {total}")
+        return 0
+
+    failed = False
+    for depth in range(1, args.depth + 1):
+        startTime = time.perf_counter()
+        nodes = perft(state, depth)
+        elapsed = time.perf_counter() - startTime
+
+        nodesPerSecond = int(nodes / elapsed) if elapsed else 0
+        expected = known.get(depth)
+        if expected is None:
+            verdict = ""
+        elif expected == nodes:
+            verdict = "ok"
+        else:
+            verdict = f"MISMATCH, expected {expected}"
+            failed = True
+
+        print(
+            f"depth {depth}: {nodes:>12d} nodes {elapsed:8.2f}s "
+            f"{nodesPerSecond:>9d} nps {verdict}"
+        )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
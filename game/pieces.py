@@ -1,7 +1,164 @@
-import pygame
-import numpy as np
+from .utils import RED_SIDE, BLUE_SIDE
+from .position import (
+    CHARIOT,
+    CANNON,
+    HORSE,
+    ELEPHANT,
+    ADVISOR,
+    LORD,
+    SOLDIER,
+    ROWS,
+    COLS,
+    SQUARES,
+    toSquare,
+    toPosition,
+)
+
+# Rows and columns the pieces are limited to, elephants can not cross the river
+# while lords and advisors can not leave the palace
+ELEPHANT_ROWS = {BLUE_SIDE: (0, 4), RED_SIDE: (5, 9)}
+PALACE_ROWS = {BLUE_SIDE: (0, 2), RED_SIDE: (7, 9)}
+PALACE_COLS = (3, 5)
+
+# Direction of moving forward and the last row before crossing the river of soldiers
+SOLDIER_DIRECTIONS = {BLUE_SIDE: 1, RED_SIDE: -1}
+RIVER_LINES = {BLUE_SIDE: 4, RED_SIDE: 5}
+
+
+def _onBoard(row, col, rows=(0, 9), cols=(0, 8)):
+    return rows[0] <= row <= rows[1] and cols[0] <= col <= cols[1]
+
+
+def _makeTable(movesFrom):
+    """
+    Build the lookup table of a piece: the moves from every square of the board
+    movesFrom: gives the moves of the piece from a row and a column
+    """
+    return tuple(tuple(movesFrom(*divmod(square, COLS))) for square in range(SQUARES))
+
+
+def _horseMoves(row, col):
+    """
+    (target, leg) of the horse, the leg square must be empty to jump
+    """
+    steps = (
+        ((-1, 0), ((-2, -1), (-2, 1))),  # Move up
+        ((1, 0), ((2, -1), (2, 1))),  # Move down
+        ((0, -1), ((1, -2), (-1, -2))),  # Move left
+        ((0, 1), ((1, 2), (-1, 2))),  # Move right
+    )
+    for (legX, legY), jumps in steps:
+        if not _onBoard(row + legX, col + legY):
+            continue
+
+        for mX, mY in jumps:
+            if _onBoard(row + mX, col + mY):
+                yield ((row + mX) * COLS + col + mY, (row + legX) * COLS + col + legY)
+
+
+def _elephantMoves(side):
+    """
+    (target, eye) of the elephant, the eye square must be empty to move
+    """
+
+    def movesFrom(row, col):
+        for mX, mY in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+            if _onBoard(row + 2 * mX, col + 2 * mY, rows=ELEPHANT_ROWS[side]):
+                yield (
+                    (row + 2 * mX) * COLS + col + 2 * mY,
+                    (row + mX) * COLS + col + mY,
+                )
+
+    return movesFrom
+
+
+def _palaceMoves(side, steps):
+    """
+    Targets of a piece that can not leave the palace
+    """
+
+    def movesFrom(row, col):
+        for mX, mY in steps:
+            if _onBoard(row + mX, col + mY, rows=PALACE_ROWS[side], cols=PALACE_COLS):
+                yield (row + mX) * COLS + col + mY
+
+    return movesFrom
+
+
+def _soldierMoves(side):
+    """
+    Targets of the soldier, which can only go sideway after crossing the river
+    """
+
+    def movesFrom(row, col):
+        direction = SOLDIER_DIRECTIONS[side]
+        if _onBoard(row + direction, col):
+            yield (row + direction) * COLS + col
+
+        crossed = row > RIVER_LINES[side] if direction == 1 else row < RIVER_LINES[side]
+        if crossed:
+            for newCol in (col - 1, col + 1):
+                if _onBoard(row, newCol):
+                    yield row * COLS + newCol
+
+    return movesFrom
+
+
+# Move tables of the leaping pieces, built once at import
+HORSE_MOVES = _makeTable(_horseMoves)
+ELEPHANT_MOVES = {
+    side: _makeTable(_elephantMoves(side)) for side in (RED_SIDE, BLUE_SIDE)
+}
+ADVISOR_MOVES = {
+    side: _makeTable(_palaceMoves(side, ((1, -1), (1, 1), (-1, 1), (-1, -1))))
+    for side in (RED_SIDE, BLUE_SIDE)
+}
+LORD_MOVES = {
+    side: _makeTable(_palaceMoves(side, ((0, -1), (0, 1), (1, 0), (-1, 0))))
+    for side in (RED_SIDE, BLUE_SIDE)
+}
+SOLDIER_MOVES = {
+    side: _makeTable(_soldierMoves(side)) for side in (RED_SIDE, BLUE_SIDE)
+}
+
+
+def _makeSlideTable(length, step):
+    """
+    Build the lookup table of chariots and cannons along a line of the board
+    Indexed by the index of the piece in the line and the occupancy mask of the line
+    Each entry holds the moves as offsets of squares from the piece:
+        (empty squares reachable, first piece on each side, second piece on each side)
+    step: distance in squares between 2 neighbour points of the line
+    """
+    table = []
+    for index in range(length):
+        entries = []
+        for occupancy in range(1 << length):
+            quiet, firstPieces, secondPieces = [], [], []
 
-from .utils import Color, ChessImages, RED_SIDE, BLUE_SIDE
+            for direction in (-1, 1):
+                blockers = 0
+                other = index + direction
+                while 0 <= other < length and blockers < 2:
+                    offset = (other - index) * step
+                    if not occupancy & (1 << other):
+                        if not blockers:
+                            quiet.append(offset)
+                    else:
+                        blockers += 1
+                        (firstPieces if blockers == 1 else secondPieces).append(offset)
+                    other += direction
+
+            entries.append((tuple(quiet), tuple(firstPieces), tuple(secondPieces)))
+        table.append(tuple(entries))
+
+    return tuple(table)
+
+
+# Slide tables of chariots and cannons, indexed by column and rank occupancy for the
+# moves along a row, and by row and file occupancy for the moves along a column
+RANK_SLIDES = _makeSlideTable(COLS, 1)
+FILE_SLIDES = _makeSlideTable(ROWS, COLS)
 
 
 class ChessPiece:
@@ -9,92 +166,27 @@ class ChessPiece:
     SELECTED = 1
 
     NAME = "A chess piece"
+    TYPE = None
 
     def __init__(self, centrePoint=(0, 0), position=(0, 0), side=RED_SIDE):
-        self.position = position
+        # The piece is a view of a square in BoardState, see BoardGame
+        self.square = toSquare(position)
         self.centrePoint = centrePoint
         self.radius = 20
 
-        self.attackingPiece = False
         self.side = side
         self.status = self.NOT_SELECTED
         self.possibleMoves = []
         self.image = None
 
-    def _getImage(self):
-        """
-        Get image of piece depends on its side and type
-        """
-        if isinstance(self, Horse):
-            return (
-                ChessImages.RED_HORSE
-                if self.getSide() == RED_SIDE
-                else ChessImages.BLUE_HORSE
-            )
-
-        if isinstance(self, Soldier):
-            return (
-                ChessImages.RED_SOLDIER
-                if self.getSide() == RED_SIDE
-                else ChessImages.BLUE_SOLDIER
-            )
-
-        if isinstance(self, Elephant):
-            return (
-                ChessImages.RED_ELEPHANT
-                if self.getSide() == RED_SIDE
-                else ChessImages.BLUE_ELEPHANT
-            )
-
-        if isinstance(self, Chariot):
-            return (
-                ChessImages.RED_CHARIOT
-                if self.getSide() == RED_SIDE
-                else ChessImages.BLUE_CHARIOT
-            )
-
-        if isinstance(self, Cannon):
-            return (
-                ChessImages.RED_CANNON
-                if self.getSide() == RED_SIDE
-                else ChessImages.BLUE_CANNON
-            )
-
-        if isinstance(self, Advisor):
-            return (
-                ChessImages.RED_ADVISOR
-                if self.getSide() == RED_SIDE
-                else ChessImages.BLUE_ADVISOR
-            )
-
-        if isinstance(self, Lord):
-            return (
-                ChessImages.RED_LORD
-                if self.getSide() == RED_SIDE
-                else ChessImages.BLUE_LORD
-            )
-
     def draw(self, win):
         """
         Draw the piece
         """
-        pygame.draw.circle(win, Color.WHITE, self.centrePoint, self.radius)
-        x, y = self.centrePoint
-        if self.status == self.SELECTED:
-            pygame.draw.rect(
-                win,
-                Color.GREEN,
-                pygame.Rect(
-                    x - self.radius - 1,
-                    y - self.radius - 1,
-                    self.radius * 2 + 2,
-                    self.radius * 2 + 2,
-                ),
-                2,
-            )
-
-        image = self._getImage()
-        win.blit(image, (x - self.radius, y - self.radius))
+        # Imported here so the rules can be used without pygame
+        from .render import drawPiece
+
+        drawPiece(win, self)
 
     def isClicked(self, pos=None):
         """
@@ -110,6 +202,10 @@ class ChessPiece:
             return True
         return False
 
+    @property
+    def position(self):
+        return toPosition(self.square)
+
     def getPosition(self):
         return self.position
 
@@ -125,17 +221,28 @@ class ChessPiece:
         """
         self.status = self.NOT_SELECTED
 
-    def checkPossibleMove(self, boardGrid):
+    @classmethod
+    def generateMoves(cls, state, square, side):
         """
-        Checking all possible moves of the piece
+        Get all the squares a piece of this type on the given square can move to
+        state: BoardState of the board
         """
         print("This is not a real chesspiece")
+        return []
 
-    def checkForAttackAbility(self):
+    def checkPossibleMove(self, state, update=True):
         """
-        Depends on the piece's position, determine whether they are a threat to the other lord or not
+        Checking all possible moves of the piece
         """
-        return None
+        movables = [
+            toPosition(square)
+            for square in self.generateMoves(state, self.square, self.side)
+        ]
+
+        if update:
+            self.possibleMoves = movables
+
+        return movables
 
     def moveToNewSpot(self, centrePoint=None, position=None):
         """
@@ -145,9 +252,7 @@ class ChessPiece:
             return
 
         self.centrePoint = centrePoint
-        self.position = position
-
-        self.checkForAttackAbility()
+        self.square = toSquare(position)
 
     def getSide(self):
         return self.side
@@ -161,14 +266,6 @@ class ChessPiece:
     def __repr__(self):
         return f"Object {self.NAME}-{self.side}"
 
-    def __eq__(self, other):
-        if not isinstance(other, ChessPiece):
-            return False
-        return self.centrePoint == other.centrePoint
-
-    def __hash__(self):
-        return hash(self.centrePoint)
-
 
 class Chariot(ChessPiece):
     """
@@ -176,64 +273,27 @@ class Chariot(ChessPiece):
     """
 
     NAME = "Chariot"
+    TYPE = CHARIOT
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.attackingPiece = True
-
-    def checkPossibleMove(self, boardGrid, update=True):
-        boardGrid = np.array(boardGrid)
-        movables = []
-
-        rowPos, colPos = self.position
-
-        column = boardGrid[:, colPos]  # get the whole colummn
-        # Move up
-        for r in range(
-            rowPos - 1, -1, -1
-        ):  # get all the row above current row, except current row
-            if not column[r]:
-                movables.append((r, colPos))
-            else:
-                otherPiece = column[r]
-                if self.isEnemy(otherPiece):
-                    movables.append((r, colPos))
-                break
-
-        # Move down
-        for r in range(rowPos + 1, 10):
-            if not column[r]:
-                movables.append((r, colPos))
-            else:
-                otherPiece = column[r]
-                if self.isEnemy(otherPiece):
-                    movables.append((r, colPos))
-                break
-
-        row = boardGrid[rowPos]  # get the whole row
-        # Move left
-        for c in range(colPos - 1, -1, -1):
-            if not row[c]:
-                movables.append((rowPos, c))
-            else:
-                otherPiece = row[c]
-                if self.isEnemy(otherPiece):
-                    movables.append((rowPos, c))
-                break
-
-        # Move right
-        for c in range(colPos + 1, 9):
-            if not row[c]:
-                movables.append((rowPos, c))
-            else:
-                otherPiece = row[c]
-                if self.isEnemy(otherPiece):
-                    movables.append((rowPos, c))
-                break
+    @classmethod
+    def generateMoves(cls, state, square, side):
+        squares = state.squares
+        sign = 1 if side == RED_SIDE else -1
 
-        if update:
-            self.possibleMoves = movables
+        row, col = divmod(square, COLS)
+        rankQuiet, rankFirst, _ = RANK_SLIDES[col][state.rankOccupancy[row]]
+        fileQuiet, fileFirst, _ = FILE_SLIDES[row][state.fileOccupancy[col]]
+
+        movables = [square + offset for offset in rankQuiet]
+        movables += [square + offset for offset in fileQuiet]
+
+        # The first piece met on each side can be captured
+        for offset in rankFirst + fileFirst:
+            if squares[square + offset] * sign < 0:
+                movables.append(square + offset)
 
         return movables
 
@@ -244,83 +304,27 @@ class Cannon(ChessPiece):
     """
 
     NAME = "Cannon"
+    TYPE = CANNON
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.attackingPiece = True
-
-    def checkPossibleMove(self, boardGrid, update=True):
-        boardGrid = np.array(boardGrid)
-        movables = []
-
-        rowPos, colPos = self.position
-
-        column = boardGrid[:, colPos]  # get the whole colummn
-        skip = False
-        # Move up
-        for r in range(
-            rowPos - 1, -1, -1
-        ):  # get all the row above current row, except current row
-            if not skip:
-                if column[r] is None:
-                    movables.append((r, colPos))
-                else:
-                    skip = True
-            else:
-                otherPiece = column[r]
-                if otherPiece is not None:
-                    if self.isEnemy(otherPiece):
-                        movables.append((r, colPos))
-                    break
-
-        # Move down
-        skip = False
-        for r in range(rowPos + 1, 10):
-            if not skip:
-                if column[r] is None:
-                    movables.append((r, colPos))
-                else:
-                    skip = True
-            else:
-                otherPiece = column[r]
-                if otherPiece is not None:
-                    if self.isEnemy(otherPiece):
-                        movables.append((r, colPos))
-                    break
-
-        row = boardGrid[rowPos]  # get the whole row
-        # Move left
-        skip = False
-        for c in range(colPos - 1, -1, -1):
-            if not skip:
-                if row[c] is None:
-                    movables.append((rowPos, c))
-                else:
-                    skip = True
-            else:
-                otherPiece = row[c]
-                if otherPiece is not None:
-                    if self.isEnemy(otherPiece):
-                        movables.append((rowPos, c))
-                    break
-
-        # Move right
-        skip = False
-        for c in range(colPos + 1, 9):
-            if not skip:
-                if row[c] is None:
-                    movables.append((rowPos, c))
-                else:
-                    skip = True
-            else:
-                otherPiece = row[c]
-                if otherPiece is not None:
-                    if self.isEnemy(otherPiece):
-                        movables.append((rowPos, c))
-                    break
 
-        if update:
-            self.possibleMoves = movables
+    @classmethod
+    def generateMoves(cls, state, square, side):
+        squares = state.squares
+        sign = 1 if side == RED_SIDE else -1
+
+        row, col = divmod(square, COLS)
+        rankQuiet, _, rankSecond = RANK_SLIDES[col][state.rankOccupancy[row]]
+        fileQuiet, _, fileSecond = FILE_SLIDES[row][state.fileOccupancy[col]]
+
+        movables = [square + offset for offset in rankQuiet]
+        movables += [square + offset for offset in fileQuiet]
+
+        # Jump over the screen to capture the first piece behind it
+        for offset in rankSecond + fileSecond:
+            if squares[square + offset] * sign < 0:
+                movables.append(square + offset)
 
         return movables
 
@@ -331,213 +335,73 @@ class Horse(ChessPiece):
     """
 
     NAME = "Horse"
+    TYPE = HORSE
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-    def checkPossibleMove(self, boardGrid, update=True):
-        boardGrid = np.array(boardGrid)
-        movables = []
-
-        rowPos, colPos = self.position
-
-        # All possibles move of a Knight
-        moveX = []
-        moveY = []
-
-        # Move up
-        stepX = [-2, -2]
-        stepY = [-1, 1]
-        if 0 <= rowPos - 1 and not boardGrid[rowPos - 1, colPos]:
-            moveX += stepX
-            moveY += stepY
-
-        # Move down
-        stepX = [2, 2]
-        stepY = [-1, 1]
-        if rowPos + 1 <= 9 and not boardGrid[rowPos + 1, colPos]:
-            moveX += stepX
-            moveY += stepY
-
-        # Move left
-        stepX = [1, -1]
-        stepY = [-2, -2]
-        if 0 <= colPos - 1 and not boardGrid[rowPos, colPos - 1]:
-            moveX += stepX
-            moveY += stepY
-
-        # Move right
-        stepX = [1, -1]
-        stepY = [2, 2]
-        if colPos + 1 <= 8 and not boardGrid[rowPos, colPos + 1]:
-            moveX += stepX
-            moveY += stepY
-
-        for mX, mY in zip(moveX, moveY):
-            newRow = rowPos + mX
-            newCol = colPos + mY
-
-            # Check if the move is valid
-            if 0 <= newRow <= 9 and 0 <= newCol <= 8:
-                if not boardGrid[newRow, newCol]:
-                    movables.append((newRow, newCol))
-                else:
-                    otherPiece = boardGrid[newRow, newCol]
-                    if self.isEnemy(otherPiece):
-                        movables.append((newRow, newCol))
-
-        if update:
-            self.possibleMoves = movables
-
-        return movables
-
-    def checkForAttackAbility(self):
-        if self.side == BLUE_SIDE and self.position[0] > 4:
-            self.attackingPiece = True
+    @classmethod
+    def generateMoves(cls, state, square, side):
+        squares = state.squares
+        sign = 1 if side == RED_SIDE else -1
 
-        if self.side == RED_SIDE and self.position[0] < 5:
-            self.attackingPiece = True
+        # The horse is blocked if its leg is occupied
+        return [
+            target
+            for target, leg in HORSE_MOVES[square]
+            if not squares[leg] and squares[target] * sign <= 0
+        ]
 
 
 class Elephant(ChessPiece):
     """
-    Horse Chess Piece
+    Elephant Chess Piece
     """
 
     NAME = "Elephant"
+    TYPE = ELEPHANT
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.moveLimit = (0, 4) if 0 <= self.position[0] <= 4 else (5, 9)
-
-    def checkPossibleMove(self, boardGrid, update=True):
-        boardGrid = np.array(boardGrid)
-        movables = []
-
-        rowPos, colPos = self.position
-
-        upLimit, downLimt = self.moveLimit
-
-        # Move up left
-        if (
-            rowPos - 1 >= upLimit
-            and colPos - 1 >= 0
-            and not boardGrid[rowPos - 1, colPos - 1]
-        ):
-            if rowPos - 2 >= upLimit and colPos - 2 >= 0:
-                if not boardGrid[rowPos - 2, colPos - 2]:
-                    movables.append((rowPos - 2, colPos - 2))
-                else:
-                    otherPiece = boardGrid[rowPos - 2, colPos - 2]
-                    if self.isEnemy(otherPiece):
-                        movables.append((rowPos - 2, colPos - 2))
-
-        # Move up right
-        if (
-            rowPos - 1 >= upLimit
-            and colPos + 1 <= 8
-            and not boardGrid[rowPos - 1, colPos + 1]
-        ):
-            if rowPos - 2 >= upLimit and colPos + 2 <= 8:
-                if not boardGrid[rowPos - 2, colPos + 2]:
-                    movables.append((rowPos - 2, colPos + 2))
-                else:
-                    otherPiece = boardGrid[rowPos - 2, colPos + 2]
-                    if self.isEnemy(otherPiece):
-                        movables.append((rowPos - 2, colPos + 2))
-
-        # Move down left
-        if (
-            rowPos + 1 <= downLimt
-            and colPos - 1 >= 0
-            and not boardGrid[rowPos + 1, colPos - 1]
-        ):
-            if rowPos + 2 >= upLimit and colPos - 2 >= 0:
-                if not boardGrid[rowPos + 2, colPos - 2]:
-                    movables.append((rowPos + 2, colPos - 2))
-                else:
-                    otherPiece = boardGrid[rowPos + 2, colPos - 2]
-                    if self.isEnemy(otherPiece):
-                        movables.append((rowPos + 2, colPos - 2))
-
-        # Move down right
-        if (
-            rowPos + 1 <= downLimt
-            and colPos + 1 <= 8
-            and not boardGrid[rowPos + 1, colPos + 1]
-        ):
-            if rowPos + 2 >= upLimit and colPos + 2 <= 8:
-                if not boardGrid[rowPos + 2, colPos + 2]:
-                    movables.append((rowPos + 2, colPos + 2))
-                else:
-                    otherPiece = boardGrid[rowPos + 2, colPos + 2]
-                    if self.isEnemy(otherPiece):
-                        movables.append((rowPos + 2, colPos + 2))
 
-        if update:
-            self.possibleMoves = movables
+    @classmethod
+    def generateMoves(cls, state, square, side):
+        squares = state.squares
+        sign = 1 if side == RED_SIDE else -1
 
-        return movables
+        # The elephant is blocked if its eye is occupied
+        return [
+            target
+            for target, eye in ELEPHANT_MOVES[side][square]
+            if not squares[eye] and squares[target] * sign <= 0
+        ]
 
 
 class Soldier(ChessPiece):
     NAME = "Soldier"
+    TYPE = SOLDIER
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.goSideWay = False
-        self.riverLine = 4 if self.position[0] < 4 else 5
-        self.direction = 1 if self.position[0] < 4 else -1
-
-    def checkPossibleMove(self, boardGrid, update=True):
-        boardGrid = np.array(boardGrid)
-        movables = []
-
-        rowPos, colPos = self.position
-
-        if self.direction == 1 and rowPos > self.riverLine:
-            self.goSideWay = True
-
-            if rowPos > self.riverLine + 1:
-                self.attackingPiece = True
-
-        if self.direction == -1 and rowPos < self.riverLine:
-            self.goSideWay = True
-
-            if rowPos < self.riverLine - 1:
-                self.attackingPiece = True
+    @classmethod
+    def generateMoves(cls, state, square, side):
+        squares = state.squares
+        sign = 1 if side == RED_SIDE else -1
 
-        # Move up
-        newRow = rowPos + self.direction
-        if 0 <= newRow <= 9:
-            if boardGrid[newRow, colPos] is None or self.isEnemy(
-                boardGrid[newRow, colPos]
-            ):
-                movables.append((newRow, colPos))
-
-        if self.goSideWay:
-            directionsX = [1, -1]
-            for direction in directionsX:
-                newCol = colPos + direction
-                if 0 <= newCol <= 8:
-                    if boardGrid[rowPos, newCol] is None or self.isEnemy(
-                        boardGrid[rowPos, newCol]
-                    ):
-                        movables.append((rowPos, newCol))
-
-        if update:
-            self.possibleMoves = movables
-
-        return movables
+        return [
+            target
+            for target in SOLDIER_MOVES[side][square]
+            if squares[target] * sign <= 0
+        ]
 
 
 class Lord(ChessPiece):
     NAME = "Lord"
+    TYPE = LORD
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.moveLimit = (0, 2) if 0 <= self.position[0] <= 2 else (7, 9)
         self.mated = False
 
         # Animation when lord is under attack
@@ -548,88 +412,57 @@ class Lord(ChessPiece):
     def draw(self, win):
         super().draw(win)
         if self.mated:
-            if self.grow:
-                self.thickness += 1
-            else:
-                self.thickness -= 1
-
-            if self.thickness == 6:
-                self.grow = False
-            if self.thickness <= 4:
-                self.grow = True
-
-            pygame.draw.circle(
-                win,
-                Color.RED,
-                self.centrePoint,
-                self.radius + self.thickness,
-                self.thickness,
-            )
-
-    def checkPossibleMove(self, boardGrid, update=True):
-        boardGrid = np.array(boardGrid)
-        movables = []
-
-        rowPos, colPos = self.position
-
-        upLimit, downLimt = self.moveLimit
-        leftLimit, rightLimit = (3, 5)
-
-        movesX = [0, 0, 1, -1]
-        movesY = [-1, 1, 0, 0]
-
-        for mX, mY in zip(movesX, movesY):
-            newRow = rowPos + mX
-            newCol = colPos + mY
-
-            # Check if the move is valid
-            if upLimit <= newRow <= downLimt and leftLimit <= newCol <= rightLimit:
-                if not boardGrid[newRow, newCol]:
-                    movables.append((newRow, newCol))
-                else:
-                    otherPiece = boardGrid[newRow, newCol]
-                    if self.isEnemy(otherPiece):
-                        movables.append((newRow, newCol))
+            self.stepPulse()
 
-        if update:
-            self.possibleMoves = movables
+            from .render import drawLordPulse
 
-        return movables
+            drawLordPulse(win, self)
+
+    def stepPulse(self):
+        """
+        Move the animation of the lord under attack one frame forward
+        """
+        if self.grow:
+            self.thickness += 1
+        else:
+            self.thickness -= 1
+
+        if self.thickness == 6:
+            self.grow = False
+        if self.thickness <= 4:
+            self.grow = True
+
+    @classmethod
+    def generateMoves(cls, state, square, side):
+        squares = state.squares
+        sign = 1 if side == RED_SIDE else -1
+
+        return [
+            target for target in LORD_MOVES[side][square] if squares[target] * sign <= 0
+        ]
 
 
 class Advisor(ChessPiece):
     NAME = "Advisor"
+    TYPE = ADVISOR
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.moveLimit = (0, 2) if 0 <= self.position[0] <= 2 else (7, 9)
-
-    def checkPossibleMove(self, boardGrid, update=True):
-        boardGrid = np.array(boardGrid)
-        movables = []
-
-        rowPos, colPos = self.position
 
-        upLimit, downLimt = self.moveLimit
-        leftLimit, rightLimit = (3, 5)
+    @classmethod
+    def generateMoves(cls, state, square, side):
+        squares = state.squares
+        sign = 1 if side == RED_SIDE else -1
 
-        movesX = [1, 1, -1, -1]
-        movesY = [-1, 1, 1, -1]
+        return [
+            target
+            for target in ADVISOR_MOVES[side][square]
+            if squares[target] * sign <= 0
+        ]
 
-        for mX, mY in zip(movesX, movesY):
-            newRow = rowPos + mX
-            newCol = colPos + mY
 
-            # Check if the move is valid
-            if upLimit <= newRow <= downLimt and leftLimit <= newCol <= rightLimit:
-                if not boardGrid[newRow, newCol]:
-                    movables.append((newRow, newCol))
-                else:
-                    otherPiece = boardGrid[newRow, newCol]
-                    if self.isEnemy(otherPiece):
-                        movables.append((newRow, newCol))
-
-        if update:
-            self.possibleMoves = movables
-
-        return movables
+# Piece classes by piece type, used to generate moves from the piece codes of a BoardState
+PIECE_CLASSES = {
+    piece.TYPE: piece
+    for piece in (Chariot, Cannon, Horse, Elephant, Advisor, Lord, Soldier)
+}
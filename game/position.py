@@ -0,0 +1,419 @@
+import random
+from array import array
+
+from .stats import COUNTERS
+from .utils import RED_SIDE, BLUE_SIDE
+
+# Size of the board
+ROWS = 10
+COLS = 9
+SQUARES = ROWS * COLS
+
+# Piece codes stored in the board, red pieces are positive and blue pieces negative
+EMPTY = 0
+CHARIOT = 1
+HORSE = 2
+ELEPHANT = 3
+ADVISOR = 4
+LORD = 5
+CANNON = 6
+SOLDIER = 7
+
+
+def _makeZobristKeys():
+    """
+    Random 64 bits keys of every piece code on every square, and of the side to move
+    The seed is fixed so keys stay the same between runs and can be saved to files
+    """
+    generator = random.Random(0x5EED)
+    pieceKeys = tuple(
+        tuple(generator.getrandbits(64) for _ in range(SQUARES))
+        for _ in range(-SOLDIER, SOLDIER + 1)
+    )
+    return pieceKeys, generator.getrandbits(64)
+
+
+# PIECE_KEYS[code + SOLDIER][square], blue pieces have negative codes
+PIECE_KEYS, SIDE_KEY = _makeZobristKeys()
+
+
+def toSquare(position):
+    """
+    Convert a (row, column) position to a square index of the board
+    """
+    row, col = position
+    return row * COLS + col
+
+
+def toPosition(square):
+    """
+    Convert a square index of the board to a (row, column) position
+    """
+    return divmod(square, COLS)
+
+
+def sideOf(code):
+    """
+    Get the side of a piece code
+    """
+    return RED_SIDE if code > 0 else BLUE_SIDE
+
+
+def makeCode(pieceType, side):
+    """
+    Get the piece code of a piece type for the given side
+    """
+    return pieceType if side == RED_SIDE else -pieceType
+
+
+def otherSide(side):
+    return BLUE_SIDE if side == RED_SIDE else RED_SIDE
+
+
+class BoardState:
+    """
+    Compact core of a position
+    A flat 90 squares array of piece codes and the occupied squares of each side
+    """
+
+    def __init__(self):
+        self.squares = array("b", bytes(SQUARES))
+        # Squares occupied by each side, indexed by the side itself
+        self.pieceSquares = [set(), set()]
+        self.lordSquares = [None, None]
+        self.turn = RED_SIDE
+
+        # Zobrist key of the position, updated with every move
+        self.key = 0
+
+        # Occupied columns of every row (9 bits) and occupied rows of every column
+        # (10 bits), used to look up the moves of chariots and cannons
+        self.rankOccupancy = [0] * ROWS
+        self.fileOccupancy = [0] * COLS
+
+    @classmethod
+    def fromSquares(cls, squares, turn=RED_SIDE):
+        """
+        Build a state from 90 piece codes and the side to move
+        """
+        state = cls()
+        for square, code in enumerate(squares):
+            if code:
+                state.addPiece(code, square)
+
+        state.setTurn(turn)
+        return state
+
+    def addPiece(self, code, square):
+        """
+        Put a piece on an empty square
+        """
+        side = sideOf(code)
+        self.squares[square] = code
+        self.pieceSquares[side].add(square)
+        self.key ^= PIECE_KEYS[code + SOLDIER][square]
+
+        row, col = divmod(square, COLS)
+        self.rankOccupancy[row] |= 1 << col
+        self.fileOccupancy[col] |= 1 << row
+
+        if abs(code) == LORD:
+            self.lordSquares[side] = square
+
+    def makeMove(self, fromSq, toSq):
+        """
+        Move the piece on fromSq to toSq and switch turn
+        Return the record unmakeMove needs to take the move back
+        """
+        squares = self.squares
+        code = squares[fromSq]
+        captured = squares[toSq]
+        side = self.turn
+        enemy = 1 - side  # sides are 0 and 1
+
+        if captured:
+            self.pieceSquares[enemy].discard(toSq)
+
+        ownSquares = self.pieceSquares[side]
+        ownSquares.discard(fromSq)
+        ownSquares.add(toSq)
+
+        squares[fromSq] = EMPTY
+        squares[toSq] = code
+
+        fromRow, fromCol = divmod(fromSq, COLS)
+        toRow, toCol = divmod(toSq, COLS)
+        self.rankOccupancy[fromRow] &= ~(1 << fromCol)
+        self.fileOccupancy[fromCol] &= ~(1 << fromRow)
+        self.rankOccupancy[toRow] |= 1 << toCol
+        self.fileOccupancy[toCol] |= 1 << toRow
+
+        if code == LORD or code == -LORD:
+            self.lordSquares[side] = toSq
+
+        key = self.key ^ SIDE_KEY
+        key ^= PIECE_KEYS[code + SOLDIER][fromSq] ^ PIECE_KEYS[code + SOLDIER][toSq]
+        if captured:
+            key ^= PIECE_KEYS[captured + SOLDIER][toSq]
+        self.key = key
+
+        self.turn = enemy
+        return (fromSq, toSq, captured)
+
+    def unmakeMove(self, record):
+        """
+        Take back a move made by makeMove
+        """
+        fromSq, toSq, captured = record
+        squares = self.squares
+        code = squares[toSq]
+        side = 1 - self.turn
+
+        ownSquares = self.pieceSquares[side]
+        ownSquares.discard(toSq)
+        ownSquares.add(fromSq)
+
+        squares[fromSq] = code
+        squares[toSq] = captured
+
+        fromRow, fromCol = divmod(fromSq, COLS)
+        self.rankOccupancy[fromRow] |= 1 << fromCol
+        self.fileOccupancy[fromCol] |= 1 << fromRow
+
+        if captured:
+            self.pieceSquares[self.turn].add(toSq)
+        else:
+            toRow, toCol = divmod(toSq, COLS)
+            self.rankOccupancy[toRow] &= ~(1 << toCol)
+            self.fileOccupancy[toCol] &= ~(1 << toRow)
+
+        if code == LORD or code == -LORD:
+            self.lordSquares[side] = fromSq
+
+        key = self.key ^ SIDE_KEY
+        key ^= PIECE_KEYS[code + SOLDIER][fromSq] ^ PIECE_KEYS[code + SOLDIER][toSq]
+        if captured:
+            key ^= PIECE_KEYS[captured + SOLDIER][toSq]
+        self.key = key
+
+        self.turn = side
+
+    def copy(self):
+        """
+        Get an independent copy of the state
+        """
+        COUNTERS["copies"] += 1
+        state = BoardState.__new__(BoardState)
+        state.squares = array("b", self.squares)
+        state.pieceSquares = [set(self.pieceSquares[0]), set(self.pieceSquares[1])]
+        state.lordSquares = list(self.lordSquares)
+        state.turn = self.turn
+        state.key = self.key
+        state.rankOccupancy = list(self.rankOccupancy)
+        state.fileOccupancy = list(self.fileOccupancy)
+        return state
+
+    def setTurn(self, side):
+        """
+        Set the side to move, keeping the key of the position up to date
+        """
+        if side != self.turn:
+            self.key ^= SIDE_KEY
+            self.turn = side
+
+    def lordsFacing(self):
+        """
+        Check if 2 lords are on the same column with nothing between them
+        """
+        redLord = self.lordSquares[RED_SIDE]
+        blueLord = self.lordSquares[BLUE_SIDE]
+
+        if redLord is None or blueLord is None:
+            return False
+
+        if redLord % COLS != blueLord % COLS:
+            return False
+
+        squares = self.squares
+        for square in range(
+            min(redLord, blueLord) + COLS, max(redLord, blueLord), COLS
+        ):
+            if squares[square]:
+                return False
+
+        return True
+
+    @classmethod
+    def fromFen(cls, fen):
+        """
+        Build a state from a FEN string, see parseFen
+        """
+        return cls.fromSquares(*parseFen(fen))
+
+    def toFen(self):
+        return toFen(self.squares, self.turn)
+
+
+# Position at the start of a game
+START_FEN = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1"
+
+# FEN letters of the piece types, red pieces are upper case and blue ones lower
+# case. H and E are read as well, as some programs write them for horses and
+# elephants
+FEN_LETTERS = {
+    CHARIOT: "r",
+    HORSE: "n",
+    ELEPHANT: "b",
+    ADVISOR: "a",
+    LORD: "k",
+    CANNON: "c",
+    SOLDIER: "p",
+}
+FEN_PIECES = {letter: pieceType for pieceType, letter in FEN_LETTERS.items()}
+FEN_PIECES.update({"h": HORSE, "e": ELEPHANT})
+
+# Most pieces of a type a side can have
+PIECE_COUNTS = {
+    CHARIOT: 2,
+    HORSE: 2,
+    ELEPHANT: 2,
+    ADVISOR: 2,
+    LORD: 1,
+    CANNON: 2,
+    SOLDIER: 5,
+}
+
+
+def _makePlacements():
+    """
+    Squares every piece type of every side may stand on, for the pieces which can
+    not go anywhere: lords, advisors, elephants and soldiers
+    Red is at the bottom of the board (rows 5 to 9), blue at the top
+    """
+    placements = {}
+    for side in (RED_SIDE, BLUE_SIDE):
+
+        def mirror(row):
+            return row if side == RED_SIDE else ROWS - 1 - row
+
+        palace = {(mirror(row), col) for row in (7, 8, 9) for col in (3, 4, 5)}
+        advisor = {
+            (mirror(row), col) for row, col in ((7, 3), (7, 5), (8, 4), (9, 3), (9, 5))
+        }
+        elephant = {
+            (mirror(row), col)
+            for row, col in ((5, 2), (5, 6), (7, 0), (7, 4), (7, 8), (9, 2), (9, 6))
+        }
+        # Soldiers never go back, they stay on their files until the river
+        soldier = {(mirror(row), col) for row in (5, 6) for col in (0, 2, 4, 6, 8)} | {
+            (mirror(row), col) for row in range(5) for col in range(COLS)
+        }
+
+        for pieceType, positions in (
+            (LORD, palace),
+            (ADVISOR, advisor),
+            (ELEPHANT, elephant),
+            (SOLDIER, soldier),
+        ):
+            placements[makeCode(pieceType, side)] = frozenset(
+                toSquare(position) for position in positions
+            )
+
+    return placements
+
+
+# PLACEMENTS[code]: squares a piece code may stand on, only for the codes of lords,
+# advisors, elephants and soldiers
+PLACEMENTS = _makePlacements()
+
+
+def parseFen(fen):
+    """
+    Read the board and the side to move of a FEN string, checking the position
+    could happen in a game: one lord each in its palace, advisors, elephants and
+    soldiers on squares they can reach and not too many pieces of a type
+    Return (squares, turn), raise ValueError if the FEN is not valid
+    """
+    fields = fen.split()
+    if not fields:
+        raise ValueError("empty FEN")
+
+    ranks = fields[0].split("/")
+    if len(ranks) != ROWS:
+        raise ValueError(f"FEN must have {ROWS} ranks, not {len(ranks)}")
+
+    squares = [EMPTY] * SQUARES
+    counts = {}
+    for row, rank in enumerate(ranks):
+        col = 0
+        for char in rank:
+            if char in "123456789":
+                col += int(char)
+                continue
+            if char.isdigit():
+                raise ValueError(f"empty run {char!r} in rank {row} of the FEN")
+
+            pieceType = FEN_PIECES.get(char.lower())
+            if pieceType is None:
+                raise ValueError(f"unknown piece {char!r} in FEN")
+            if col >= COLS:
+                raise ValueError(f"rank {row} of the FEN is too long")
+
+            code = makeCode(pieceType, RED_SIDE if char.isupper() else BLUE_SIDE)
+            square = row * COLS + col
+            if code in PLACEMENTS and square not in PLACEMENTS[code]:
+                raise ValueError(f"{char} can not stand on {(row, col)}")
+
+            squares[square] = code
+            counts[code] = counts.get(code, 0) + 1
+            col += 1
+
+        if col != COLS:
+            raise ValueError(f"rank {row} of the FEN has {col} columns, not {COLS}")
+
+    for code, count in counts.items():
+        if count > PIECE_COUNTS[abs(code)]:
+            raise ValueError(f"too many pieces of code {code} in FEN")
+
+    for side in (RED_SIDE, BLUE_SIDE):
+        if counts.get(makeCode(LORD, side)) != 1:
+            raise ValueError("each side needs exactly one lord")
+
+    turn = RED_SIDE
+    if len(fields) > 1:
+        if fields[1] in ("w", "r"):
+            turn = RED_SIDE
+        elif fields[1] == "b":
+            turn = BLUE_SIDE
+        else:
+            raise ValueError(f"unknown side to move {fields[1]!r} in FEN")
+
+    return squares, turn
+
+
+def toFen(squares, turn):
+    """
+    Write the board and the side to move as a FEN string
+    """
+    ranks = []
+    for row in range(ROWS):
+        rank = ""
+        empty = 0
+        for col in range(COLS):
+            code = squares[row * COLS + col]
+            if not code:
+                empty += 1
+                continue
+
+            if empty:
+                rank += str(empty)
+                empty = 0
+            letter = FEN_LETTERS[abs(code)]
+            rank += letter.upper() if code > 0 else letter
+
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+
+    side = "w" if turn == RED_SIDE else "b"
+    return f"{'/'.join(ranks)} {side} - - 0 1"
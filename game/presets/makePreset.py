@@ -1,5 +1,10 @@
 import os
 
+# Run from the project folder: python -m game.presets.makePreset
+from ..board import PIECE_TYPES
+from ..position import COLS, EMPTY, SQUARES, makeCode, toFen
+from ..utils import RED_SIDE, BLUE_SIDE
+
 DIR = os.path.dirname(__file__)
 SEPERATOR = " ******** "
 
@@ -35,4 +40,14 @@ for r, side, cannonR, solR in zip([0, 9], ("blue", "red"), [2, 7], [3, 6]):
 
 with open(os.path.join(DIR, "standard.cfg"), "w") as f:
     for piece, row, col, side in final:
-        f.write(f"{piece}{SEPERATOR}{row}{SEPERATOR}{col}{SEPERATOR}{side}\n")
\ No newline at end of file
+        f.write(f"{piece}{SEPERATOR}{row}{SEPERATOR}{col}{SEPERATOR}{side}\n")
+
+# The same position as a FEN string, written by the FEN code of the game
+squares = [EMPTY] * SQUARES
+for piece, row, col, side in final:
+    squares[row * COLS + col] = makeCode(
+        PIECE_TYPES[piece], RED_SIDE if side == "red" else BLUE_SIDE
+    )
+
+with open(os.path.join(DIR, "standard.fen"), "w") as f:
+    f.write(toFen(squares, RED_SIDE) + "\n")
@@ -0,0 +1,322 @@
+import argparse
+import struct
+import sys
+import time
+from array import array
+from collections import Counter, namedtuple
+
+from .board import BoardGame
+from .journal import FLAG_CHECK
+from .movegen import generateLegalMoves
+from .position import (
+    CHARIOT,
+    CANNON,
+    HORSE,
+    ELEPHANT,
+    ADVISOR,
+    LORD,
+    SOLDIER,
+    COLS,
+    ROWS,
+    toPosition,
+    toSquare,
+)
+from .utils import RED_SIDE
+
+# A record file starts with MAGIC, then holds games one after the other
+# Every game is a GAME_HEADER (result, flags, number of moves) followed by its
+# moves, 16 bits each, all little endian:
+#   bits 0-6: square the piece moves from
+#   bits 7-13: square the piece moves to
+#   bit 14: the move gives check
+MAGIC = b"XQR1"
+GAME_HEADER = struct.Struct("<BBH")
+
+SQUARE_BITS = 7
+SQUARE_MASK = (1 << SQUARE_BITS) - 1
+CHECK_BIT = 1 << 14
+
+# Results of a game
+UNFINISHED, RED_WON, BLUE_WON, DRAW = range(4)
+RESULT_NAMES = {UNFINISHED: "*", RED_WON: "1-0", BLUE_WON: "0-1", DRAW: "1/2-1/2"}
+
+# Games are at most this long, the number of moves must fit in the header
+MAX_MOVES = 0xFFFF
+
+GameRecord = namedtuple("GameRecord", ["result", "flags", "moves"])
+
+
+def encodeMove(fromSq, toSq, check=False):
+    return fromSq | toSq << SQUARE_BITS | (CHECK_BIT if check else 0)
+
+
+def decodeMove(code):
+    """
+    Return the (fromSq, toSq) of an encoded move
+    """
+    return code & SQUARE_MASK, code >> SQUARE_BITS & SQUARE_MASK
+
+
+def resultOf(game):
+    """
+    Result of a Game
+    """
+    if not game.isOver:
+        return UNFINISHED
+    if game.winner is None:
+        return DRAW
+    return RED_WON if game.winner == RED_SIDE else BLUE_WON
+
+
+def encodeGame(moves, result=UNFINISHED, flags=0):
+    """
+    Encode a game into bytes
+    moves: (fromSq, toSq) pairs, or (fromSq, toSq, captured, flags) journal moves
+    """
+    if len(moves) > MAX_MOVES:
+        raise ValueError(f"a game can not have more than {MAX_MOVES} moves")
+
+    codes = array(
+        "H",
+        (
+            encodeMove(
+                move[0], move[1], check=len(move) > 3 and bool(move[3] & FLAG_CHECK)
+            )
+            for move in moves
+        ),
+    )
+    if sys.byteorder == "big":
+        codes.byteswap()
+
+    return GAME_HEADER.pack(result, flags, len(codes)) + codes.tobytes()
+
+
+class RecordWriter:
+    """
+    Append games to a record file, writing its magic number if the file is new
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+
+    def write(self, moves, result=UNFINISHED, flags=0):
+        self.file.write(encodeGame(moves, result, flags))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def readGames(path):
+    """
+    Iterate the games of a record file one by one, only one game is in memory
+    at a time however big the file is
+    Yield a GameRecord for each game, its moves being the encoded 16 bit moves
+    """
+    with open(path, "rb", buffering=1 << 16) as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a game record file")
+
+        while True:
+            header = f.read(GAME_HEADER.size)
+            if not header:
+                return
+            if len(header) < GAME_HEADER.size:
+                raise ValueError(f"{path} ends in the middle of a game")
+
+            result, flags, count = GAME_HEADER.unpack(header)
+            data = f.read(count * 2)
+            if len(data) < count * 2:
+                raise ValueError(f"{path} ends in the middle of a game")
+
+            moves = array("H")
+            moves.frombytes(data)
+            if sys.byteorder == "big":
+                moves.byteswap()
+
+            yield GameRecord(result, flags, moves)
+
+
+def replay(moves, board=None):
+    """
+    Play encoded moves on a board through BoardGame.movePiece, checking each of
+    them is legal
+    Return the board after the last move, raise ValueError on an illegal move
+    """
+    board = board or BoardGame()
+
+    for ply, code in enumerate(moves):
+        fromSq, toSq = decodeMove(code)
+        if (fromSq, toSq) not in generateLegalMoves(board.state):
+            raise ValueError(f"illegal move {toIccs(fromSq, toSq)} at ply {ply + 1}")
+        board.movePiece(toPosition(fromSq), toPosition(toSq))
+
+    return board
+
+
+def toIccs(fromSq, toSq):
+    """
+    ICCS coordinates of a move, files a to i from the left of red and ranks 0 to
+    9 from the bottom of red, such as h2e2
+    """
+    fromRow, fromCol = toPosition(fromSq)
+    toRow, toCol = toPosition(toSq)
+    return (
+        f"{chr(ord('a') + fromCol)}{ROWS - 1 - fromRow}"
+        f"{chr(ord('a') + toCol)}{ROWS - 1 - toRow}"
+    )
+
+
+def fromIccs(text):
+    """
+    Return the (fromSq, toSq) of a move in ICCS coordinates, h2e2 or H2-E2
+    """
+    text = text.replace("-", "").lower()
+    if len(text) != 4:
+        raise ValueError(f"not an ICCS move: {text}")
+
+    squares = []
+    for fileChar, rankChar in (text[:2], text[2:]):
+        col = ord(fileChar) - ord("a")
+        row = ROWS - 1 - int(rankChar)
+        if not (0 <= col < COLS and 0 <= row < ROWS):
+            raise ValueError(f"not an ICCS move: {text}")
+        squares.append(toSquare((row, col)))
+
+    return tuple(squares)
+
+
+# WXF letters of the piece types
+WXF_LETTERS = {
+    CHARIOT: "R",
+    HORSE: "H",
+    ELEPHANT: "E",
+    ADVISOR: "A",
+    LORD: "K",
+    CANNON: "C",
+    SOLDIER: "P",
+}
+# Pieces which move along lines, their number is the distance and not a file
+WXF_STRAIGHT = {CHARIOT, LORD, CANNON, SOLDIER}
+
+
+def toWxf(state, fromSq, toSq):
+    """
+    WXF notation of a move played from the given position, such as C2.5 or H8+7
+    Files are counted 1 to 9 from the right of the side moving, + goes forward,
+    - backward and . along the rank
+    """
+    squares = state.squares
+    code = squares[fromSq]
+    pieceType = abs(code)
+    red = code > 0
+
+    fromRow, fromCol = toPosition(fromSq)
+    toRow, toCol = toPosition(toSq)
+
+    def fileOf(col):
+        return COLS - col if red else col + 1
+
+    # Red moves up the board, blue moves down
+    forward = (fromRow - toRow) if red else (toRow - fromRow)
+
+    # 2 pieces of the same kind on one file are told apart by front and rear
+    sameFile = [row for row in range(ROWS) if squares[row * COLS + fromCol] == code]
+    if len(sameFile) == 2:
+        front = min(sameFile) if red else max(sameFile)
+        origin = "+" if fromRow == front else "-"
+    else:
+        origin = str(fileOf(fromCol))
+
+    if forward == 0:
+        return f"{WXF_LETTERS[pieceType]}{origin}.{fileOf(toCol)}"
+
+    direction = "+" if forward > 0 else "-"
+    if pieceType in WXF_STRAIGHT:
+        target = abs(forward)
+    else:
+        target = fileOf(toCol)
+
+    return f"{WXF_LETTERS[pieceType]}{origin}{direction}{target}"
+
+
+def exportText(record, notation="iccs"):
+    """
+    Write a game as numbered move pairs in ICCS or WXF notation, followed by its
+    result, checking the moves on the way
+    """
+    board = BoardGame()
+    words = []
+
+    for ply, code in enumerate(record.moves):
+        fromSq, toSq = decodeMove(code)
+        if (fromSq, toSq) not in generateLegalMoves(board.state):
+            raise ValueError(f"illegal move {toIccs(fromSq, toSq)} at ply {ply + 1}")
+
+        if notation == "wxf":
+            move = toWxf(board.state, fromSq, toSq)
+        else:
+            move = toIccs(fromSq, toSq)
+
+        if ply % 2 == 0:
+            words.append(f"{ply // 2 + 1}.")
+        words.append(move)
+
+        board.movePiece(toPosition(fromSq), toPosition(toSq))
+
+    words.append(RESULT_NAMES.get(record.result, "*"))
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read a game record file")
+    parser.add_argument("path")
+    parser.add_argument(
+        "--validate", action="store_true", help="replay every game with the rules"
+    )
+    parser.add_argument(
+        "--export",
+        choices=("iccs", "wxf"),
+        default=None,
+        help="print every game in this notation",
+    )
+    args = parser.parse_args()
+
+    results = Counter()
+    games = moves = invalid = 0
+    startTime = time.perf_counter()
+
+    for record in readGames(args.path):
+        games += 1
+        moves += len(record.moves)
+        results[RESULT_NAMES.get(record.result, "?")] += 1
+
+        try:
+            if args.export:
+                print(exportText(record, args.export))
+            elif args.validate:
+                replay(record.moves)
+        except ValueError as error:
+            invalid += 1
+            print(f"game {games}: {error}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - startTime
+    summary = ", ".join(f"{name}: {count}" for name, count in sorted(results.items()))
+    print(
+        f"{games} games, {moves} moves ({summary}), {invalid} invalid, "
+        f"{games / elapsed if elapsed else 0:.0f} games/s",
+        file=sys.stderr if args.export else sys.stdout,
+    )
+
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import pygame
+
+from .pieces import ChessPiece
+from .position import CHARIOT, CANNON, HORSE, ELEPHANT, ADVISOR, LORD, SOLDIER
+from .utils import Color, ChessImages, RED_SIDE, BLUE_SIDE
+
+# Everything drawn with pygame lives here, so the board, the pieces and the game
+# logic can be used without pygame
+
+MOVABLE_RADIUS = 7
+# Largest thickness of the ring around a lord under attack, see Lord.stepPulse
+PULSE_THICKNESS = 6
+
+
+def drawBoardLines(win, board):
+    """
+    Draw the static part of the chess board: lines, palaces, river and border
+    """
+    riverCoordinate = ()
+
+    # Draw all the lines
+    for row in range(board.rows + 1):
+        pygame.draw.line(
+            win,
+            Color.GREY,
+            (board.x, board.y + row * board.gap),
+            (board.x + board.width, board.y + row * board.gap),
+            2,
+        )
+
+        if row == board.rows // 2:
+            riverCoordinate = (board.x + 2, board.y + row * board.gap + 2)
+
+        for col in range(board.cols + 1):
+            pygame.draw.line(
+                win,
+                Color.GREY,
+                (col * board.gap + board.x, board.y),
+                (col * board.gap + board.x, board.height + board.y),
+                2,
+            )
+
+    # Draw the palace
+    palaceCoors = [
+        (
+            (board.x + board.gap * 3, board.y),
+            (board.x + board.gap * 5, board.y + board.gap * 2),
+        ),
+        (
+            (board.x + board.gap * 5, board.y),
+            (board.x + board.gap * 3, board.y + board.gap * 2),
+        ),
+        (
+            (board.x + board.gap * 3, board.y + board.gap * 7),
+            (board.x + board.gap * 5, board.y + board.gap * 9),
+        ),
+        (
+            (board.x + board.gap * 5, board.y + board.gap * 7),
+            (board.x + board.gap * 3, board.y + board.gap * 9),
+        ),
+    ]
+    for point1, point2 in palaceCoors:
+        pygame.draw.line(win, Color.GREY, point1, point2, 2)
+
+    # Draw the river
+    pygame.draw.rect(
+        win,
+        Color.BLACK,
+        pygame.Rect(*riverCoordinate, board.width - 2, board.gap - 2),
+    )
+
+    # Draw the border
+    pygame.draw.rect(win, Color.WHITE, boardRect(board), 2)
+
+
+def boardRect(board):
+    """
+    Area of the board on the window, border included
+    """
+    return pygame.Rect(
+        board.x - board.border,
+        board.y - board.border,
+        board.width + board.border * 2,
+        board.height + board.border * 2,
+    )
+
+
+class StaticLayer:
+    """
+    Background of the window with the static part of the board drawn once,
+    made again only when the window is resized
+    """
+
+    def __init__(self):
+        self.surface = None
+        self.key = None
+
+    def get(self, size, board):
+        key = (size, board.x, board.y, board.gap)
+        if key != self.key:
+            surface = pygame.Surface(size)
+            surface.fill(Color.BLACK)
+            drawBoardLines(surface, board)
+
+            self.surface = surface
+            self.key = key
+
+        return self.surface
+
+
+# Shared by every drawGrid call and FrameRenderer, so there is a single
+# background the size of the window
+_staticLayer = StaticLayer()
+
+
+def drawBoard(win, board):
+    """
+    Draw the chess board
+    """
+    rect = boardRect(board)
+    win.blit(_staticLayer.get(win.get_size(), board), rect, rect)
+
+    for piece in board.activePices:
+        piece.draw(win)
+
+    for position in board.movables:
+        drawMovable(win, board.getCoordinateFromPosition(position))
+
+
+def drawMovable(win, centrePoint):
+    """
+    Draw the marker of a position the selected piece can move to
+    """
+    pygame.draw.circle(win, Color.GREEN, centrePoint, MOVABLE_RADIUS)
+
+
+# Image file of every piece type, by side
+PIECE_IMAGES = {
+    CHARIOT: {RED_SIDE: "RED_CHARIOT", BLUE_SIDE: "BLUE_CHARIOT"},
+    CANNON: {RED_SIDE: "RED_CANNON", BLUE_SIDE: "BLUE_CANNON"},
+    HORSE: {RED_SIDE: "RED_HORSE", BLUE_SIDE: "BLUE_HORSE"},
+    ELEPHANT: {RED_SIDE: "RED_ELEPHANT", BLUE_SIDE: "BLUE_ELEPHANT"},
+    ADVISOR: {RED_SIDE: "RED_ADVISOR", BLUE_SIDE: "BLUE_ADVISOR"},
+    LORD: {RED_SIDE: "RED_LORD", BLUE_SIDE: "BLUE_LORD"},
+    SOLDIER: {RED_SIDE: "RED_SOLDIER", BLUE_SIDE: "BLUE_SOLDIER"},
+}
+
+
+def prepareSurface(surface):
+    """
+    Convert a surface to the pixel format of the window, which makes blitting it
+    much faster, once there is a window to convert to
+    """
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert_alpha()
+
+
+class SpriteCache:
+    """
+    Pictures of the pieces with their white background and selection frame
+    already drawn on, made once for every piece type, side and selection state
+    """
+
+    def __init__(self):
+        self.sprites = {}
+
+    def get(self, piece):
+        key = (piece.TYPE, piece.side, piece.status, piece.radius)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = self.makeSprite(*key)
+        return sprite
+
+    def makeSprite(self, pieceType, side, status, radius):
+        # The frame of a selected piece goes 2 pixels past the circle
+        margin = 2
+        size = (radius + margin) * 2
+        centre = radius + margin
+
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, Color.WHITE, (centre, centre), radius)
+        if status == ChessPiece.SELECTED:
+            pygame.draw.rect(
+                sprite,
+                Color.GREEN,
+                pygame.Rect(margin - 1, margin - 1, radius * 2 + 2, radius * 2 + 2),
+                2,
+            )
+
+        image = getattr(ChessImages, PIECE_IMAGES[pieceType][side])
+        sprite.blit(image, (margin, margin))
+
+        return prepareSurface(sprite)
+
+
+# Shared by every piece
+_sprites = SpriteCache()
+
+
+def drawPiece(win, piece):
+    """
+    Draw the piece
+    """
+    sprite = _sprites.get(piece)
+    x, y = piece.centrePoint
+    offset = sprite.get_width() // 2
+    win.blit(sprite, (x - offset, y - offset))
+
+
+class TextCache:
+    """
+    Rendered texts, so drawing the same text again is a single blit
+    Texts which change often (search statistics) would fill it up, so it is
+    emptied once it holds maxSize texts
+    """
+
+    def __init__(self, maxSize=256):
+        self.maxSize = maxSize
+        self.texts = {}
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.texts.get(key)
+        if surface is None:
+            if len(self.texts) >= self.maxSize:
+                self.texts.clear()
+            surface = self.texts[key] = prepareSurface(font.render(text, True, color))
+        return surface
+
+
+def drawLordPulse(win, lord):
+    """
+    Draw the red ring around a lord under attack
+    """
+    pygame.draw.circle(
+        win,
+        Color.RED,
+        lord.centrePoint,
+        lord.radius + lord.thickness,
+        lord.thickness,
+    )
+
+
+class FrameRenderer:
+    """
+    Draw the game to the window and push only the areas which changed since the
+    last frame: moved, captured or selected pieces, movable markers, the ring of
+    a lord under attack and the control panel
+    """
+
+    def __init__(self, win):
+        self.win = win
+        self.layer = _staticLayer
+
+        # What was drawn on the last frame, None to draw everything again
+        self.lastItems = None
+        self.lastPanel = None
+        self.lastSize = None
+
+    def invalidate(self):
+        """
+        Draw the whole window again on the next frame
+        """
+        self.lastItems = None
+
+    def sceneItems(self, board):
+        """
+        Everything drawn over the static board, each item compares equal from
+        one frame to the other as long as it looks the same
+        """
+        items = [
+            ("piece", piece.centrePoint, piece.status, piece)
+            for piece in board.activePices
+        ]
+
+        for lord in (board.redLord, board.blueLord):
+            if lord.mated:
+                items.append(("pulse", lord.centrePoint, lord.thickness, lord))
+
+        items += [
+            ("movable", board.getCoordinateFromPosition(position), None, None)
+            for position in board.movables
+        ]
+        return items
+
+    def itemRect(self, item):
+        kind, (x, y), _, piece = item
+
+        if kind == "piece":
+            radius = piece.radius + 2
+        elif kind == "pulse":
+            radius = piece.radius + PULSE_THICKNESS + 1
+        else:
+            radius = MOVABLE_RADIUS + 1
+
+        return pygame.Rect(x - radius, y - radius, radius * 2 + 1, radius * 2 + 1)
+
+    def drawItems(self, items, area=None):
+        """
+        Draw the items in the order of the board, only those touching area if given
+        """
+        for item in items:
+            if area is not None and not area.colliderect(self.itemRect(item)):
+                continue
+
+            kind, centrePoint, _, piece = item
+            if kind == "piece":
+                drawPiece(self.win, piece)
+            elif kind == "pulse":
+                drawLordPulse(self.win, piece)
+            else:
+                drawMovable(self.win, centrePoint)
+
+    def draw(self, game, controlPanel):
+        win = self.win
+        board = game.board
+
+        for lord in (board.redLord, board.blueLord):
+            if lord.mated:
+                lord.stepPulse()
+
+        items = self.sceneItems(board)
+        panel = (
+            game.isOver,
+            game.winner,
+            game.endReason,
+            game.turn,
+            game.lastSearch,
+            game.room,
+            game.onlineSide,
+            game.roomStarted,
+            game.bookHint,
+            game.stats.overlayLines() if game.stats.visible else None,
+        )
+        panelRect = pygame.Rect(
+            controlPanel.x, controlPanel.y, controlPanel.width, controlPanel.height
+        )
+
+        size = win.get_size()
+        background = self.layer.get(size, board)
+
+        if self.lastItems is None or size != self.lastSize:
+            win.blit(background, (0, 0))
+            self.drawItems(items)
+            controlPanel.draw(win)
+            pygame.display.update()
+
+        else:
+            changed = set(items).symmetric_difference(self.lastItems)
+            dirtyRects = [self.itemRect(item) for item in changed]
+            if panel != self.lastPanel:
+                dirtyRects.append(panelRect)
+
+            for rect in dirtyRects:
+                win.set_clip(rect)
+                win.blit(background, rect, rect)
+                self.drawItems(items, area=rect)
+
+                if rect.colliderect(panelRect):
+                    controlPanel.draw(win)
+
+            win.set_clip(None)
+
+            if dirtyRects:
+                pygame.display.update(dirtyRects)
+
+        self.lastItems = items
+        self.lastPanel = panel
+        self.lastSize = size
@@ -0,0 +1,378 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+import pygame
+
+from .controlPanel import ControlPanel
+from .game import Game
+from .movegen import generateLegalMoves, isInCheck
+from .pieces import Lord
+from .position import BoardState, EMPTY, LORD, START_FEN, parseFen, toFen, toPosition
+from .render import FrameRenderer, boardRect, drawMovable
+from .utils import Color, WIN_HEIGHT, WIN_WIDTH
+
+# Time the drawing of the game without a screen, with SDL's dummy video driver,
+# over games played at random from the start position:
+#   python -m game.renderBench --gaps 60 80 --pieces 32 12 --output bench.json
+#   python -m game.renderBench --baseline bench.json
+# Pieces keep the size of their pictures whatever the gap between the lines
+
+# Steps of a frame, timed on every frame
+#   frame: the whole window drawn again and flipped, the sum of the steps below
+#     but renderer
+#   fill: the window cleared
+#   drawGrid: BoardGame.drawGrid, done as its 4 steps to time them one by one
+#     board: the static board, copied from the background layer
+#     pieces: ChessPiece.draw of every piece but the lords
+#     lords: Lord.draw of both lords, their ring included when under attack
+#     movables: the marks of the squares the selected piece can go to
+#   controlPanel: ControlPanel.draw
+#   flip: the window pushed to the screen
+#   renderer: FrameRenderer.draw, the dirty areas only as main.py does, timed
+#     over the same game played again
+PHASES = (
+    "frame",
+    "fill",
+    "drawGrid",
+    "board",
+    "pieces",
+    "lords",
+    "movables",
+    "controlPanel",
+    "flip",
+    "renderer",
+)
+
+# What is shown over the pieces on every frame
+#   none: nothing
+#   selected: a piece of the side to move is selected
+#   movables: a piece is selected and the squares it can go to are marked
+OVERLAYS = ("none", "selected", "movables")
+
+# Gap between the lines of the board in the game
+DEFAULT_GAP = WIN_WIDTH // 15
+# The game goes back to the start once this many moves were played
+MAX_PLIES = 60
+DEFAULT_OUTPUT = "renderBench.json"
+
+
+def reducedFen(pieces, rng):
+    """
+    FEN of the start position with pieces taken off at random until the given
+    number of pieces is left, lords included, without leaving the lords facing
+    """
+    squares, turn = parseFen(START_FEN)
+    candidates = [
+        square for square, code in enumerate(squares) if code and abs(code) != LORD
+    ]
+    rng.shuffle(candidates)
+
+    count = len(candidates) + 2
+    for square in candidates:
+        if count <= pieces:
+            break
+
+        code = squares[square]
+        squares[square] = EMPTY
+        if BoardState.fromSquares(squares, turn).lordsFacing():
+            squares[square] = code
+        else:
+            count -= 1
+
+    if count != pieces:
+        raise ValueError(f"can not leave {pieces} pieces on the board")
+    return toFen(squares, turn)
+
+
+def scaleBoard(board, gap):
+    """
+    Draw the board with the given gap between its lines
+    Return the size of a window the board fits in, next to the control panel
+    """
+    board.gap = gap
+    board.width = board.cols * gap
+    board.height = board.rows * gap
+    board.calculatePostion()
+    board.y = max(board.y, board.border)
+
+    for piece in board.activePices:
+        piece.centrePoint = board.getCoordinateFromPosition(piece.position)
+
+    return (
+        max(WIN_WIDTH, board.x + board.width + board.border),
+        max(WIN_HEIGHT, board.y + board.height + board.border),
+    )
+
+
+def summarize(samples):
+    """
+    Distribution of the times of a step, in milliseconds
+    """
+    times = sorted(seconds * 1000 for seconds in samples)
+    percentiles = statistics.quantiles(times, n=100, method="inclusive")
+    return {
+        "min": round(times[0], 4),
+        "median": round(statistics.median(times), 4),
+        "mean": round(statistics.fmean(times), 4),
+        "p90": round(percentiles[89], 4),
+        "p99": round(percentiles[98], 4),
+        "max": round(times[-1], 4),
+    }
+
+
+class Scene:
+    """
+    Game drawn by the benchmark: a random game from a position with the given
+    number of pieces, played forward MAX_PLIES moves, taken back to the start and
+    played again, one move for every frame
+    """
+
+    def __init__(self, gap, pieces, overlay, seed=0):
+        self.rng = random.Random(seed)
+        self.overlay = overlay
+
+        self.game = Game(fen=reducedFen(pieces, self.rng))
+        self.board = self.game.board
+        self.size = scaleBoard(self.board, gap)
+
+        # Records of the moves played from the start, see BoardGame.makeMove
+        self.records = []
+        self.forward = True
+
+    def step(self):
+        """
+        Play or take back the next move and show the overlay of the frame
+        """
+        board = self.board
+        if self.game.selectedPiece is not None:
+            board.deselectPiece(self.game.selectedPiece.position)
+            self.game.selectedPiece = None
+
+        moves = generateLegalMoves(board.state, board.moveCache)
+        if not moves or len(self.records) >= MAX_PLIES:
+            self.forward = False
+        elif not self.records:
+            self.forward = True
+
+        if self.forward:
+            fromSquare, toSquare = self.rng.choice(moves)
+            record = board.makeMove(toPosition(fromSquare), toPosition(toSquare))
+            self.records.append(record)
+        else:
+            board.unmakeMove(self.records.pop())
+
+        self.game.turn = board.turn
+        board.getLord(board.turn).mated = isInCheck(board.state, board.turn)
+
+        if self.overlay == "none":
+            return
+        moves = generateLegalMoves(board.state, board.moveCache)
+        if not moves:
+            return
+        piece = board.pieceViews[self.rng.choice(moves)[0]]
+        if self.overlay == "selected":
+            piece.makeSelected()
+            self.game.selectedPiece = piece
+        else:
+            self.game.selectPiece(piece)
+
+
+def timeFrames(scene, win, frames, warmup):
+    """
+    Draw the whole window on every frame of the scene, the first warmup frames
+    not timed
+    Return the times of every step of PHASES but renderer, in seconds
+    """
+    game = scene.game
+    board = scene.board
+    controlPanel = ControlPanel(game)
+    # The background drawGrid uses, see drawBoard
+    layer = FrameRenderer(win).layer
+    lords = (board.redLord, board.blueLord)
+    timings = {phase: [] for phase in PHASES if phase != "renderer"}
+
+    for frame in range(warmup + frames):
+        scene.step()
+        pieces = [piece for piece in board.activePices if not isinstance(piece, Lord)]
+        rect = boardRect(board)
+
+        startTime = time.perf_counter()
+        win.fill(Color.BLACK)
+        fillTime = time.perf_counter()
+
+        # The steps of drawBoard, every piece and lord is drawn once
+        win.blit(layer.get(win.get_size(), board), rect, rect)
+        boardTime = time.perf_counter()
+        for piece in pieces:
+            piece.draw(win)
+        piecesTime = time.perf_counter()
+        for lord in lords:
+            lord.draw(win)
+        lordsTime = time.perf_counter()
+        for position in board.movables:
+            drawMovable(win, board.getCoordinateFromPosition(position))
+        movablesTime = time.perf_counter()
+
+        controlPanel.draw(win)
+        panelTime = time.perf_counter()
+        pygame.display.flip()
+        flipTime = time.perf_counter()
+
+        if frame < warmup:
+            continue
+
+        timings["frame"].append(flipTime - startTime)
+        timings["fill"].append(fillTime - startTime)
+        timings["drawGrid"].append(movablesTime - fillTime)
+        timings["board"].append(boardTime - fillTime)
+        timings["pieces"].append(piecesTime - boardTime)
+        timings["lords"].append(lordsTime - piecesTime)
+        timings["movables"].append(movablesTime - lordsTime)
+        timings["controlPanel"].append(panelTime - movablesTime)
+        timings["flip"].append(flipTime - panelTime)
+
+    return timings
+
+
+def timeRenderer(scene, win, frames, warmup):
+    """
+    Draw the frames of the scene with FrameRenderer, the first warmup ones not
+    timed
+    Return the times of the frames, in seconds
+    """
+    controlPanel = ControlPanel(scene.game)
+    renderer = FrameRenderer(win)
+    timings = []
+
+    for frame in range(warmup + frames):
+        scene.step()
+
+        startTime = time.perf_counter()
+        renderer.draw(scene.game, controlPanel)
+        if frame >= warmup:
+            timings.append(time.perf_counter() - startTime)
+
+    return timings
+
+
+def scenarioKey(result):
+    return (result["gap"], result["pieces"], result["overlay"])
+
+
+def compare(results, baseline):
+    """
+    Print the change of the median time of every step from a baseline file
+    """
+    previous = {scenarioKey(result): result for result in baseline["scenarios"]}
+    for result in results:
+        old = previous.get(scenarioKey(result))
+        if old is None:
+            continue
+
+        changes = []
+        for phase in PHASES:
+            if phase not in old["phases"]:
+                continue
+            before = old["phases"][phase]["median"]
+            after = result["phases"][phase]["median"]
+            if before:
+                changes.append(f"{phase} {(after - before) / before:+.0%}")
+
+        gap, pieces, overlay = scenarioKey(result)
+        print(f"gap {gap:>3d} pieces {pieces:>2d} {overlay:<8s} " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the drawing of the game without a screen"
+    )
+    parser.add_argument("--gaps", type=int, nargs="+", default=[DEFAULT_GAP])
+    parser.add_argument("--pieces", type=int, nargs="+", default=[32])
+    parser.add_argument(
+        "--overlays", nargs="+", choices=OVERLAYS, default=list(OVERLAYS)
+    )
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", default=DEFAULT_OUTPUT, help="JSON file of the results"
+    )
+    parser.add_argument("--baseline", default=None, help="results to compare with")
+    args = parser.parse_args()
+
+    if args.frames < 2:
+        parser.error("--frames must be at least 2")
+    # A piece has to stand between the lords
+    if not all(3 <= pieces <= 32 for pieces in args.pieces):
+        parser.error("--pieces must be between 3 and 32")
+
+    # Another driver can be picked from the environment to time a real screen
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.font.init()
+
+    results = []
+    for gap, pieces, overlay in itertools.product(
+        args.gaps, args.pieces, args.overlays
+    ):
+        scene = Scene(gap, pieces, overlay, args.seed)
+        win = pygame.display.set_mode(scene.size)
+        timings = timeFrames(scene, win, args.frames, args.warmup)
+
+        # The same game again, so the lord's ring still moves once a frame
+        scene = Scene(gap, pieces, overlay, args.seed)
+        timings["renderer"] = timeRenderer(scene, win, args.frames, args.warmup)
+
+        phases = {phase: summarize(samples) for phase, samples in timings.items()}
+        results.append(
+            {
+                "gap": gap,
+                "pieces": pieces,
+                "overlay": overlay,
+                "frames": args.frames,
+                "phases": phases,
+            }
+        )
+
+        frame = phases["frame"]
+        print(
+            f"gap {gap:>3d} pieces {pieces:>2d} {overlay:<8s} "
+            f"frame {frame['median']:7.3f} ms median {frame['p99']:7.3f} ms p99  "
+            f"drawGrid {phases['drawGrid']['median']:7.3f}  "
+            f"panel {phases['controlPanel']['median']:7.3f}  "
+            f"renderer {phases['renderer']['median']:7.3f}"
+        )
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "driver": pygame.display.get_driver(),
+                "pygame": pygame.version.ver,
+                "sdl": ".".join(map(str, pygame.get_sdl_version())),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "seed": args.seed,
+                "scenarios": results,
+            },
+            f,
+            indent=1,
+        )
+    print(f"results written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
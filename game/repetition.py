@@ -0,0 +1,182 @@
+from collections import Counter
+
+from .journal import FLAG_CHECK
+from .movegen import isAttacked, isInCheck
+from .pieces import PIECE_CLASSES, RIVER_LINES, SOLDIER_DIRECTIONS
+from .position import CHARIOT, LORD, SOLDIER, COLS, otherSide, sideOf
+
+# A game ends once the same position is reached this many times
+REPETITION_LIMIT = 3
+
+# Reasons a game ended, shown under the winner
+NO_MOVE_LEFT = "no move left"
+REPETITION = "repetition"
+PERPETUAL_CHECK = "perpetual check"
+PERPETUAL_CHASE = "perpetual chase"
+
+
+def _crossedRiver(square, side):
+    row = square // COLS
+    if SOLDIER_DIRECTIONS[side] == 1:
+        return row > RIVER_LINES[side]
+    return row < RIVER_LINES[side]
+
+
+def threatenedPieces(state, square):
+    """
+    Get the squares of the enemy pieces the piece on the given square chases:
+    pieces it can take which are not protected, and chariots whatever protects
+    them when the attacker is not a chariot itself
+    Lords and soldiers never chase, and lords and soldiers which did not cross
+    the river can not be chased
+    """
+    squares = state.squares
+    code = squares[square]
+    pieceType = abs(code)
+    if pieceType in (LORD, SOLDIER):
+        return set()
+
+    side = sideOf(code)
+    enemy = otherSide(side)
+    threatened = set()
+
+    # The captures are tried for the side of the piece, whoever is to move
+    turn = state.turn
+    state.setTurn(side)
+
+    for target in PIECE_CLASSES[pieceType].generateMoves(state, square, side):
+        victimType = abs(squares[target])
+        if not victimType or victimType == LORD:
+            continue
+        if victimType == SOLDIER and not _crossedRiver(target, enemy):
+            continue
+
+        record = state.makeMove(square, target)
+        legal = not isInCheck(state, side)
+        protected = isAttacked(state, target, enemy)
+        state.unmakeMove(record)
+
+        if legal and (
+            not protected or (victimType == CHARIOT and pieceType != CHARIOT)
+        ):
+            threatened.add(target)
+
+    state.setTurn(turn)
+    return threatened
+
+
+def chasedPieces(state, side):
+    """
+    Get the squares of the enemy pieces chased by any piece of the given side
+    """
+    chased = set()
+    # threatenedPieces plays moves, which changes the set of squares
+    for square in list(state.pieceSquares[side]):
+        chased |= threatenedPieces(state, square)
+    return chased
+
+
+def chasingMoves(state, moves):
+    """
+    Check which of the last moves of a game chase a piece: after the move, a
+    piece of the mover chases an enemy piece nobody chased before it. Moving a
+    piece out of the way of another one chases too
+    state: position reached by the moves, left as it is
+    moves: (fromSq, toSq, captured) of the moves, oldest first
+    Return a list of booleans, one for every move
+    """
+    state = state.copy()
+    chases = []
+    # Enemy pieces do not move during a move, so the squares can be compared
+    for record in reversed(moves):
+        mover = otherSide(state.turn)
+        chasedAfter = chasedPieces(state, mover)
+        state.unmakeMove(record)
+        chases.append(bool(chasedAfter - chasedPieces(state, mover)))
+
+    chases.reverse()
+    return chases
+
+
+class PositionHistory:
+    """
+    Keys of the positions of a game, with the number of times every key was
+    reached so a repetition is seen on every move in constant time, and the
+    flags of the moves between them to judge it
+    Chases are only looked for by judge, so playing a move costs no more than
+    counting its position
+    """
+
+    def __init__(self, key):
+        self.keys = [key]
+        # Journal flags of the move leading to every position after the first
+        self.flags = []
+        self.counts = Counter({key: 1})
+
+    def __len__(self):
+        return len(self.flags)
+
+    def push(self, key, flags=0):
+        """
+        Add the position reached by a move
+        Return the number of times it was reached
+        """
+        self.keys.append(key)
+        self.flags.append(flags)
+        self.counts[key] += 1
+        return self.counts[key]
+
+    def pop(self):
+        """
+        Forget the last position, when its move is taken back
+        """
+        key = self.keys.pop()
+        self.flags.pop()
+        self.counts[key] -= 1
+        if not self.counts[key]:
+            del self.counts[key]
+
+    def repetitions(self):
+        """
+        Number of times the current position was reached
+        """
+        return self.counts[self.keys[-1]]
+
+    def judge(self, state, moves):
+        """
+        Decide a game whose current position was reached REPETITION_LIMIT times,
+        from the moves played since it was first reached. Under the Asian rules a
+        side which checks or chases with every move while the other side does not
+        loses, any other repetition is a draw
+        state: current position of the game
+        moves: (fromSq, toSq, captured) of the moves of the game, oldest first
+        Return (winner, reason), winner being None for a draw, or None if the
+        position was not repeated enough
+        """
+        if self.repetitions() < REPETITION_LIMIT:
+            return None
+
+        start = self.keys.index(self.keys[-1])
+        cycle = self.flags[start:]
+        chases = chasingMoves(state, moves[len(moves) - len(cycle) :])
+        checks = [bool(flags & FLAG_CHECK) for flags in cycle]
+
+        # Moves of the last mover are the last one and every other one before it
+        lastMover = otherSide(state.turn)
+        movesOf = {
+            lastMover: range(len(cycle) - 1, -1, -2),
+            otherSide(lastMover): range(len(cycle) - 2, -1, -2),
+        }
+
+        forcing = {
+            side: all(checks[move] or chases[move] for move in moves)
+            for side, moves in movesOf.items()
+        }
+        for side, moves in movesOf.items():
+            if forcing[side] and not forcing[otherSide(side)]:
+                allChecks = all(checks[move] for move in moves)
+                return otherSide(side), (
+                    PERPETUAL_CHECK if allChecks else PERPETUAL_CHASE
+                )
+
+        return None, REPETITION
@@ -0,0 +1,98 @@
+import asyncio
+import queue
+import threading
+
+from .roomServer import DEFAULT_HOST, DEFAULT_PORT, decode, encode
+
+
+class RoomClient:
+    """
+    Connection to a RoomServer running on its own thread, so the game loop never
+    waits for the network
+    Messages from the server are queued until the game loop polls them, after a
+    "connected" message, or a "failed" one if the server can not be reached
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+
+        self.messages = queue.Queue()
+        self.loop = asyncio.new_event_loop()
+        self.writer = None
+        self.connected = threading.Event()
+        # Reason the connection failed or closed, None while it is fine
+        self.error = None
+        # Set by close, the connection may still be under way
+        self.closing = False
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._receive())
+        finally:
+            # Frees its selector and file descriptors once the connection ended
+            self.loop.close()
+
+    async def _receive(self):
+        try:
+            reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        except OSError as error:
+            self.error = str(error)
+            self.messages.put({"type": "failed", "reason": self.error})
+            self.connected.set()
+            return
+
+        if self.closing:
+            self.writer.close()
+            return
+
+        self.messages.put({"type": "connected"})
+        self.connected.set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.messages.put(decode(line))
+        except ConnectionError as error:
+            self.error = str(error)
+        finally:
+            self.error = self.error or "connection closed"
+            self.messages.put({"type": "left"})
+            self.writer.close()
+
+    def waitConnected(self, timeout=5.0):
+        """
+        Block until the connection is made or failed
+        Return True if the client is connected
+        """
+        self.connected.wait(timeout)
+        return self.writer is not None and self.error is None
+
+    def send(self, message):
+        """
+        Send a message to the server from any thread
+        """
+        if self.writer is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.writer.write, encode(message))
+
+    def poll(self):
+        """
+        Return the messages received since the last poll, without blocking
+        """
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def close(self):
+        self.closing = True
+        if self.writer is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.writer.close)
@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import random
+import time
+
+from .movegen import generateLegalMoves
+from .position import toPosition
+from .roomServer import DEFAULT_PORT, RoomServer, decode, encode, startState
+from .stats import percentile
+from .utils import RED_SIDE
+
+
+class SimulatedClient:
+    """
+    A player of the load test, talking the room protocol over its own connection
+    It keeps a board of its own to pick random legal moves
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port):
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def send(self, message):
+        self.writer.write(encode(message))
+        await self.writer.drain()
+
+    async def receive(self, *kinds):
+        """
+        Wait for the next message of one of the given types
+        """
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("server closed the connection")
+            message = decode(line)
+            if message["type"] in kinds:
+                return message
+            if message["type"] == "error":
+                raise RuntimeError(message["reason"])
+
+    def close(self):
+        self.writer.close()
+
+
+async def playRoom(host, port, moves, rng, latencies):
+    """
+    Open a room with 2 simulated clients and play up to moves random moves,
+    timing every move from sending it to its acknowledgement
+    Return the number of moves played
+    """
+    red = await SimulatedClient.connect(host, port)
+    blue = await SimulatedClient.connect(host, port)
+
+    try:
+        await red.send({"type": "create"})
+        room = (await red.receive("joined"))["room"]
+        await blue.send({"type": "join", "room": room})
+        await blue.receive("joined")
+        await red.receive("start")
+        await blue.receive("start")
+
+        state = startState()
+        players = {RED_SIDE: (red, blue), 1 - RED_SIDE: (blue, red)}
+
+        played = 0
+        while played < moves:
+            legalMoves = generateLegalMoves(state)
+            if not legalMoves:
+                break
+
+            fromSquare, toSquare = rng.choice(legalMoves)
+            player, opponent = players[state.turn]
+
+            startTime = time.perf_counter()
+            await player.send(
+                {
+                    "type": "move",
+                    "from": toPosition(fromSquare),
+                    "to": toPosition(toSquare),
+                }
+            )
+            await player.receive("ack")
+            latencies.append(time.perf_counter() - startTime)
+
+            await opponent.receive("move")
+            state.makeMove(fromSquare, toSquare)
+            played += 1
+
+        return played
+
+    finally:
+        red.close()
+        blue.close()
+
+
+async def runLoad(host, port, rooms, moves, seed):
+    """
+    Play rooms games at the same time against the server
+    Return (moves played, seconds, move latencies)
+    """
+    latencies = []
+    startTime = time.perf_counter()
+    played = await asyncio.gather(
+        *(
+            playRoom(host, port, moves, random.Random(seed + index), latencies)
+            for index in range(rooms)
+        )
+    )
+    return sum(played), time.perf_counter() - startTime, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the room server with simulated players"
+    )
+    parser.add_argument(
+        "--host", default=None, help="server to test, a loopback one if not given"
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--rooms", type=int, default=200, help="rooms played at once")
+    parser.add_argument("--moves", type=int, default=40, help="moves in every room")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    async def run():
+        host, port = args.host, args.port
+        server = None
+        if host is None:
+            # Same process and event loop as the clients
+            server = await RoomServer().start("127.0.0.1", 0)
+            host, port = server.sockets[0].getsockname()[:2]
+
+        try:
+            return await runLoad(host, port, args.rooms, args.moves, args.seed)
+        finally:
+            if server is not None:
+                server.close()
+
+    played, elapsed, latencies = asyncio.run(run())
+    latencies.sort()
+
+    print(
+        f"{args.rooms} rooms, {played} moves in {elapsed:.2f}s: "
+        f"{played / elapsed:.0f} moves/s"
+    )
+    print(
+        "round trip ms: "
+        + "  ".join(
+            f"{name} {percentile(latencies, fraction) * 1000:.2f}"
+            for name, fraction in (
+                ("p50", 0.5),
+                ("p90", 0.9),
+                ("p99", 0.99),
+                ("max", 1.0),
+            )
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import json
+import random
+import string
+import threading
+
+from .movegen import generateLegalMoves
+from .position import BoardState, START_FEN, toSquare
+from .utils import DEFAULT_HOST, DEFAULT_PORT, RED_SIDE, BLUE_SIDE
+
+# Seconds startLoopbackServer waits for its server to listen
+START_TIMEOUT = 5.0
+
+# Messages are JSON objects, one per line, with a "type":
+#   client -> server
+#       {"type": "create"}                          open a room, play red
+#       {"type": "join", "room": code}              join a room, play blue
+#       {"type": "join"}                            join the oldest open room
+#       {"type": "move", "from": [r, c], "to": [r, c]}
+#       {"type": "leave"}
+#   server -> client
+#       {"type": "joined", "room": code, "side": side}
+#       {"type": "start", "room": code}             both players are there
+#       {"type": "move", "from": [r, c], "to": [r, c], "ply": ply}
+#       {"type": "ack", "ply": ply}                 your move was played
+#       {"type": "over", "winner": side}
+#       {"type": "left"}                            the opponent is gone
+#       {"type": "error", "reason": text}
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def decode(line):
+    return json.loads(line)
+
+
+# Every room starts from a copy of this position
+_startState = BoardState.fromFen(START_FEN)
+
+
+def startState():
+    return _startState.copy()
+
+
+class Room:
+    """
+    A game between 2 connections, the server keeps its own board to check moves
+    """
+
+    def __init__(self, code):
+        self.code = code
+        self.state = startState()
+        self.players = {}
+        self.ply = 0
+        self.over = False
+
+    def isOpen(self):
+        return len(self.players) < 2
+
+    def opponentOf(self, side):
+        return self.players.get(RED_SIDE if side == BLUE_SIDE else BLUE_SIDE)
+
+    def playMove(self, side, fromPos, toPos):
+        """
+        Play a move of the given side if it is legal
+        Return the reason the move was refused, None if it was played
+        """
+        if self.over:
+            return "game is over"
+        if self.isOpen():
+            return "waiting for an opponent"
+        if side != self.state.turn:
+            return "not your turn"
+
+        move = (toSquare(fromPos), toSquare(toPos))
+        if move not in generateLegalMoves(self.state):
+            return "illegal move"
+
+        self.state.makeMove(*move)
+        self.ply += 1
+        return None
+
+
+class Connection:
+    """
+    One client of the server, and the room it plays in
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.room = None
+        self.side = None
+
+    def send(self, message):
+        self.writer.write(encode(message))
+
+
+class RoomServer:
+    """
+    Host games between clients over TCP, all rooms in one asyncio event loop
+    """
+
+    def __init__(self):
+        self.rooms = {}
+        self.rng = random.Random()
+        # Number of moves played in all rooms since the server started
+        self.moves = 0
+
+    def newCode(self):
+        while True:
+            code = "".join(self.rng.choice(string.ascii_uppercase) for _ in range(4))
+            if code not in self.rooms:
+                return code
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        Start listening, port 0 picks a free port
+        Return the asyncio server
+        """
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        connection = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    message = decode(line)
+                    self.dispatch(connection, message)
+                except (ValueError, KeyError, TypeError):
+                    connection.send({"type": "error", "reason": "bad message"})
+
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.leave(connection)
+            writer.close()
+
+    def dispatch(self, connection, message):
+        kind = message["type"]
+
+        if kind == "create":
+            self.leave(connection)
+            room = Room(self.newCode())
+            self.rooms[room.code] = room
+            self.enter(connection, room, RED_SIDE)
+
+        elif kind == "join":
+            self.leave(connection)
+            code = message.get("room")
+            if code is None:
+                room = next((r for r in self.rooms.values() if r.isOpen()), None)
+            else:
+                room = self.rooms.get(code)
+
+            if room is None or not room.isOpen():
+                connection.send({"type": "error", "reason": "no room to join"})
+                return
+
+            side = BLUE_SIDE if RED_SIDE in room.players else RED_SIDE
+            self.enter(connection, room, side)
+
+        elif kind == "move":
+            self.move(connection, tuple(message["from"]), tuple(message["to"]))
+
+        elif kind == "leave":
+            self.leave(connection)
+
+        else:
+            connection.send({"type": "error", "reason": f"unknown type {kind}"})
+
+    def enter(self, connection, room, side):
+        room.players[side] = connection
+        connection.room = room
+        connection.side = side
+        connection.send({"type": "joined", "room": room.code, "side": side})
+
+        if not room.isOpen():
+            for player in room.players.values():
+                player.send({"type": "start", "room": room.code})
+
+    def move(self, connection, fromPos, toPos):
+        room = connection.room
+        if room is None:
+            connection.send({"type": "error", "reason": "not in a room"})
+            return
+
+        reason = room.playMove(connection.side, fromPos, toPos)
+        if reason is not None:
+            connection.send({"type": "error", "reason": reason})
+            return
+
+        self.moves += 1
+        connection.send({"type": "ack", "ply": room.ply})
+        room.opponentOf(connection.side).send(
+            {"type": "move", "from": fromPos, "to": toPos, "ply": room.ply}
+        )
+
+        if not generateLegalMoves(room.state):
+            room.over = True
+            for player in room.players.values():
+                player.send({"type": "over", "winner": connection.side})
+
+    def leave(self, connection):
+        room = connection.room
+        if room is None:
+            return
+
+        room.players.pop(connection.side, None)
+        connection.room = connection.side = None
+
+        # A room is closed as soon as a player leaves
+        for player in room.players.values():
+            player.send({"type": "left"})
+            player.room = player.side = None
+        room.players.clear()
+        self.rooms.pop(room.code, None)
+
+
+def startLoopbackServer(host=DEFAULT_HOST, port=0):
+    """
+    Run a RoomServer on its own thread of this process, for playing and testing
+    on one machine
+    Return the (host, port) it listens on, raise OSError if it can not listen
+    """
+    ready = threading.Event()
+    address = []
+    errors = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            server = loop.run_until_complete(RoomServer().start(host, port))
+        except Exception as error:
+            errors.append(error)
+            ready.set()
+            loop.close()
+            return
+
+        address.append(server.sockets[0].getsockname()[:2])
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    if not ready.wait(START_TIMEOUT):
+        raise TimeoutError(f"the room server did not start on {host}:{port}")
+    if errors:
+        raise errors[0]
+    return address[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chinese chess room server")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    async def serve():
+        server = await RoomServer().start(args.host, args.port)
+        print(f"Serving rooms on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from collections import Counter, defaultdict, namedtuple
+
+from .engine import Engine, PIECE_VALUES
+from .game import Game
+from .position import toPosition, toSquare
+from .record import DRAW, RecordWriter, resultOf
+from .stats import percentile
+from .utils import RED_SIDE, BLUE_SIDE
+
+# A game ends in a draw once this many moves were played without a winner
+MAX_PLIES = 300
+
+# What a worker sends back for every game
+# winner: RED_SIDE, BLUE_SIDE or None for a draw
+# moveTimes: seconds each chooser took to pick its moves, by side
+# moves: the moves of the journal and result: the result code, see game/record.py
+GameResult = namedtuple(
+    "GameResult",
+    ["red", "blue", "winner", "plies", "elapsed", "moveTimes", "moves", "result"],
+)
+
+
+def legalMoves(game):
+    """
+    Get the legal moves of the side to move as (fromPos, toPos) pairs
+    """
+    game.calculateNextMoves()
+    return [
+        (piece.position, target)
+        for piece in game.board.activePices
+        if piece.side == game.turn
+        for target in piece.possibleMoves
+    ]
+
+
+def chooseRandom(game, rng):
+    """
+    Play any legal move
+    """
+    return rng.choice(legalMoves(game))
+
+
+def chooseGreedy(game, rng):
+    """
+    Take the most valuable piece that can be taken, any move if nothing can be
+    """
+    moves = legalMoves(game)
+    squares = game.board.state.squares
+
+    def victimValue(move):
+        victim = squares[toSquare(move[1])]
+        return PIECE_VALUES[abs(victim)] if victim else 0
+
+    best = max(victimValue(move) for move in moves)
+    if not best:
+        return rng.choice(moves)
+    return rng.choice([move for move in moves if victimValue(move) == best])
+
+
+# One engine for each worker process, so its transposition table is reused
+_engine = None
+
+
+def chooseEngine(game, rng, timeLimit=0.1):
+    """
+    Play the move of the engine after searching timeLimit seconds
+    """
+    global _engine
+    if _engine is None:
+        _engine = Engine()
+
+    move = _engine.search(game.board.state, timeLimit=timeLimit).move
+    return toPosition(move[0]), toPosition(move[1])
+
+
+CHOOSERS = {
+    "random": chooseRandom,
+    "greedy": chooseGreedy,
+    "engine": chooseEngine,
+}
+
+
+def playGame(red, blue, seed, maxPlies=MAX_PLIES, timeLimit=0.1):
+    """
+    Play a whole game between 2 choosers without a window
+    red, blue: names of the choosers in CHOOSERS
+    """
+    rng = random.Random(seed)
+    game = Game()
+
+    names = {RED_SIDE: red, BLUE_SIDE: blue}
+    moveTimes = {RED_SIDE: [], BLUE_SIDE: []}
+    startTime = time.perf_counter()
+
+    plies = 0
+    while not game.isOver and plies < maxPlies:
+        side = game.turn
+        chooser = CHOOSERS[names[side]]
+
+        moveStart = time.perf_counter()
+        if chooser is chooseEngine:
+            fromPos, toPos = chooser(game, rng, timeLimit)
+        else:
+            fromPos, toPos = chooser(game, rng)
+        moveTimes[side].append(time.perf_counter() - moveStart)
+
+        game.playMove(fromPos, toPos)
+        plies += 1
+
+    return GameResult(
+        red=red,
+        blue=blue,
+        winner=game.winner,
+        plies=plies,
+        elapsed=time.perf_counter() - startTime,
+        moveTimes=moveTimes,
+        moves=game.journal.moves(),
+        result=resultOf(game) if game.isOver else DRAW,
+    )
+
+
+def _playGame(task):
+    return playGame(*task)
+
+
+def runTournament(tasks, workers=None, onResult=None):
+    """
+    Play every game of tasks in a pool of processes, one for each core by default
+    tasks: (red, blue, seed, maxPlies, timeLimit) of every game
+    Return the list of GameResult, in the order the games finished
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+
+    with context.Pool(processes=workers or os.cpu_count()) as pool:
+        for result in pool.imap_unordered(_playGame, tasks, chunksize=4):
+            results.append(result)
+            if onResult:
+                onResult(result)
+
+    return results
+
+
+def summarize(results, elapsed):
+    """
+    Make the report of a tournament: win/draw/loss of every pairing and every
+    chooser, games per second and the move latency percentiles of every chooser
+    """
+    pairings = defaultdict(Counter)
+    choosers = defaultdict(Counter)
+    latencies = defaultdict(list)
+    plies = 0
+
+    for result in results:
+        pairing = pairings[(result.red, result.blue)]
+        if result.winner is None:
+            pairing["draw"] += 1
+            choosers[result.red]["draw"] += 1
+            choosers[result.blue]["draw"] += 1
+        elif result.winner == RED_SIDE:
+            pairing["red"] += 1
+            choosers[result.red]["win"] += 1
+            choosers[result.blue]["loss"] += 1
+        else:
+            pairing["blue"] += 1
+            choosers[result.blue]["win"] += 1
+            choosers[result.red]["loss"] += 1
+
+        latencies[result.red].extend(result.moveTimes[RED_SIDE])
+        latencies[result.blue].extend(result.moveTimes[BLUE_SIDE])
+        plies += result.plies
+
+    lines = [f"{'red':>8} {'blue':>8} {'red won':>8} {'draw':>6} {'blue won':>8}"]
+    for (red, blue), counts in sorted(pairings.items()):
+        lines.append(
+            f"{red:>8} {blue:>8} {counts['red']:>8d} "
+            f"{counts['draw']:>6d} {counts['blue']:>8d}"
+        )
+
+    lines.append("")
+    lines.append(
+        f"{'chooser':>8} {'W':>6} {'D':>6} {'L':>6} "
+        f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    )
+    for name, counts in sorted(choosers.items()):
+        times = sorted(latencies[name])
+        lines.append(
+            f"{name:>8} {counts['win']:>6d} {counts['draw']:>6d} {counts['loss']:>6d} "
+            + " ".join(
+                f"{percentile(times, fraction) * 1000:>8.2f}"
+                for fraction in (0.5, 0.9, 0.99, 1.0)
+            )
+        )
+
+    gamesPerSecond = len(results) / elapsed if elapsed else 0.0
+    lines.append("")
+    lines.append(
+        f"{len(results)} games, {plies} moves in {elapsed:.1f}s: "
+        f"{gamesPerSecond:.2f} games/s"
+    )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play games between move choosers in parallel without a window"
+    )
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--red", choices=sorted(CHOOSERS), default="random")
+    parser.add_argument("--blue", choices=sorted(CHOOSERS), default="greedy")
+    parser.add_argument(
+        "--swap", action="store_true", help="let the choosers change sides every game"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="processes to use (one per core)"
+    )
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    parser.add_argument(
+        "--time", type=float, default=0.1, help="seconds the engine thinks a move"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--record", default=None, help="record file to add the games to"
+    )
+    args = parser.parse_args()
+
+    tasks = []
+    for index in range(args.games):
+        red, blue = args.red, args.blue
+        if args.swap and index % 2:
+            red, blue = blue, red
+        tasks.append((red, blue, args.seed + index, args.max_plies, args.time))
+
+    writer = RecordWriter(args.record) if args.record else None
+
+    def onResult(result):
+        if writer is not None:
+            writer.write(result.moves, result.result)
+
+    startTime = time.perf_counter()
+    try:
+        results = runTournament(tasks, workers=args.workers, onResult=onResult)
+    finally:
+        if writer is not None:
+            writer.close()
+    print(summarize(results, time.perf_counter() - startTime))
+
+
+if __name__ == "__main__":
+    main()
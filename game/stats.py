@@ -0,0 +1,155 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Work done by the rules core, counted where it is done and read by MoveStats.
+# The rules core imports this module, so the modules only needed to profile,
+# trace memory or export are imported by the methods using them:
+#   pseudoMoves: pseudo-legal moves generated
+#   probes: moves played and taken back to check they are legal
+#   copies: BoardState copies
+COUNTERS = Counter()
+COUNTER_NAMES = ("pseudoMoves", "probes", "copies")
+
+# Lines of the profile printed when a capture ends
+PROFILE_LINES = 20
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a sorted list
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+class MoveStats:
+    """
+    Counters and timings of every move of a game
+    Each move gets a record of the work done since the move before it, selecting
+    pieces included, which can be shown on an overlay or written as JSON lines
+    """
+
+    def __init__(self):
+        # One dict for every move, see endMove
+        self.records = []
+        # Whether the overlay is shown
+        self.visible = False
+
+        # Seconds spent in every timed step since the last move
+        self.timings = Counter()
+        self.counters = Counter(COUNTERS)
+
+        self.tracingMemory = False
+        # Profiler of a capture, the moves left to capture and its file
+        self.profiler = None
+        self.profileMoves = 0
+        self.profilePath = None
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Add the time spent in the with block to the timing of the given name
+        """
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - startTime
+
+    def traceMemory(self):
+        """
+        Record the peak memory of every move from now on, tracemalloc makes the
+        game a few times slower
+        """
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.tracingMemory = True
+
+    def profile(self, moves, path):
+        """
+        Run cProfile over the next moves and save its stats to a file
+        """
+        import cProfile
+
+        self.profiler = cProfile.Profile()
+        self.profileMoves = moves
+        self.profilePath = path
+        self.profiler.enable()
+
+    def endMove(self, move):
+        """
+        Close the record of a move
+        move: text of the move, such as its ICCS coordinates
+        Return the record: ply, move, counters since the move before it, timings
+        in milliseconds and the peak memory in KiB if it is traced
+        """
+        record = {"ply": len(self.records) + 1, "move": move}
+        record.update(
+            (name, COUNTERS[name] - self.counters[name]) for name in COUNTER_NAMES
+        )
+        record["ms"] = {
+            name: round(seconds * 1000, 3)
+            for name, seconds in sorted(self.timings.items())
+        }
+        if self.tracingMemory:
+            import tracemalloc
+
+            record["peakKiB"] = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.reset_peak()
+
+        self.records.append(record)
+        self.counters = Counter(COUNTERS)
+        self.timings.clear()
+
+        if self.profiler is not None:
+            self.profileMoves -= 1
+            if self.profileMoves <= 0:
+                self.stopProfile()
+
+        return record
+
+    def stopProfile(self):
+        """
+        End a cProfile capture, saving and printing its stats
+        """
+        import pstats
+
+        self.profiler.disable()
+        self.profiler.dump_stats(self.profilePath)
+        pstats.Stats(self.profiler).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        self.profiler = None
+
+    def overlayLines(self):
+        """
+        Text lines of the overlay, about the last move
+        """
+        if not self.records:
+            return ("No move yet",)
+
+        record = self.records[-1]
+        timings = record["ms"]
+        lines = [
+            f"Ply {record['ply']}  {record['move']}",
+            f"Moves {record['pseudoMoves']}  probes {record['probes']}",
+            f"Copies {record['copies']}",
+        ]
+        lines += [f"{name} {ms:.2f} ms" for name, ms in timings.items()]
+        if "peakKiB" in record:
+            lines.append(f"Peak {record['peakKiB']} KiB")
+        return tuple(lines)
+
+    def exportJson(self, path):
+        """
+        Append the records of the moves to a JSON lines file
+        """
+        import json
+
+        with open(path, "a") as f:
+            for record in self.records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
@@ -0,0 +1,513 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from .movegen import (
+    DIAGONALS,
+    ELEPHANT_ORIGINS,
+    HORSE_ORIGINS,
+    RAYS,
+    generateLegalMoves,
+    isInCheck,
+)
+from .pieces import PIECE_CLASSES
+from .position import (
+    BoardState,
+    CHARIOT,
+    CANNON,
+    HORSE,
+    ELEPHANT,
+    ADVISOR,
+    LORD,
+    SOLDIER,
+    COLS,
+    ROWS,
+    SQUARES,
+    FEN_LETTERS,
+    FEN_PIECES,
+    PLACEMENTS,
+    makeCode,
+    otherSide,
+)
+from .utils import ROOT_DIR, RED_SIDE, BLUE_SIDE
+
+TABLEBASE_DIR = os.path.join(ROOT_DIR, "tablebases")
+
+# A table file is a HEADER (MAGIC, signature, number of entries) followed by
+# one signed 16 bits value for every index, little endian:
+#   0: draw
+#   n > 0: the side to move mates in n plies
+#   n < 0: the side to move is mated in -n - 1 plies
+#   INVALID: no such position (pieces on the same square, side not to move in
+#   check, or the same pieces listed in another order)
+MAGIC = b"XQT1"
+HEADER = struct.Struct("<4s16sI")
+VALUE = struct.Struct("<h")
+INVALID = -0x8000
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+# Order of the pieces of a side in a signature
+SIGNATURE_ORDER = (LORD, CHARIOT, CANNON, HORSE, SOLDIER, ADVISOR, ELEPHANT)
+
+
+def winValue(plies):
+    return plies
+
+
+def lossValue(plies):
+    return -plies - 1
+
+
+def decodeValue(value):
+    """
+    Return the (result, plies to mate) of a table value for the side to move
+    """
+    if value > 0:
+        return WIN, value
+    if value < 0:
+        return LOSS, -value - 1
+    return DRAW, None
+
+
+def parseSignature(text):
+    """
+    Read a material signature such as KR-KAA, the red pieces before the dash
+    and the blue ones after it, each side with exactly one lord
+    Return the piece codes in the order of the table
+    """
+    parts = text.upper().split("-")
+    if len(parts) != 2:
+        raise ValueError(f"signature {text!r} must be red pieces-blue pieces")
+
+    codes = []
+    for side, part in zip((RED_SIDE, BLUE_SIDE), parts):
+        types = []
+        for letter in part:
+            pieceType = FEN_PIECES.get(letter.lower())
+            if pieceType is None:
+                raise ValueError(f"unknown piece {letter!r} in signature {text!r}")
+            types.append(pieceType)
+
+        if types.count(LORD) != 1:
+            raise ValueError(f"each side of signature {text!r} needs one lord")
+
+        types.sort(key=SIGNATURE_ORDER.index)
+        codes += [makeCode(pieceType, side) for pieceType in types]
+
+    return tuple(codes)
+
+
+def signatureName(codes):
+    parts = ["", ""]
+    for code in codes:
+        parts[0 if code > 0 else 1] += FEN_LETTERS[abs(code)].upper()
+    return "-".join(parts)
+
+
+def signatureOf(state):
+    """
+    Get the signature of the material of a position
+    """
+    codes = [
+        state.squares[square]
+        for side in (RED_SIDE, BLUE_SIDE)
+        for square in state.pieceSquares[side]
+    ]
+    codes.sort(key=lambda code: (code < 0, SIGNATURE_ORDER.index(abs(code))))
+    return signatureName(codes)
+
+
+def mirrorSquare(square):
+    """
+    Square seen from the other side of the board
+    """
+    row, col = divmod(square, COLS)
+    return (ROWS - 1 - row) * COLS + col
+
+
+def mirrorState(state):
+    """
+    Turn the board around and swap the colours, so blue plays what red played
+    """
+    squares = [0] * SQUARES
+    for square, code in enumerate(state.squares):
+        if code:
+            squares[mirrorSquare(square)] = -code
+    return BoardState.fromSquares(squares, otherSide(state.turn))
+
+
+class TableIndex:
+    """
+    Numbering of the positions of a signature: every piece takes one of the
+    squares it may stand on, and the side to move is the lowest digit
+    """
+
+    def __init__(self, codes):
+        self.codes = codes
+        self.squares = [
+            tuple(sorted(PLACEMENTS.get(code, range(SQUARES)))) for code in codes
+        ]
+        self.digits = [
+            {square: digit for digit, square in enumerate(squares)}
+            for squares in self.squares
+        ]
+
+        self.size = 2
+        for squares in self.squares:
+            self.size *= len(squares)
+
+    def index(self, state):
+        """
+        Get the index of a position with the material of the table
+        Pieces of the same code are taken in the order of their squares
+        """
+        bySquare = {}
+        for side in (RED_SIDE, BLUE_SIDE):
+            for square in state.pieceSquares[side]:
+                bySquare.setdefault(state.squares[square], []).append(square)
+        for squares in bySquare.values():
+            squares.sort(reverse=True)
+
+        index = 0
+        for code, digits, squares in zip(self.codes, self.digits, self.squares):
+            index = index * len(squares) + digits[bySquare[code].pop()]
+        return index * 2 + state.turn
+
+    def decode(self, index):
+        """
+        Get the (squares, turn) of an index, squares being the square of every
+        piece of the table, None if the index is not a position of its own
+        """
+        turn = index % 2
+        index //= 2
+
+        placed = []
+        for squares in reversed(self.squares):
+            index, digit = divmod(index, len(squares))
+            placed.append(squares[digit])
+        placed.reverse()
+
+        if len(set(placed)) != len(placed):
+            return None
+
+        # The same pieces are only counted once, in the order of their squares
+        for slot in range(1, len(placed)):
+            if (
+                self.codes[slot] == self.codes[slot - 1]
+                and placed[slot] < placed[slot - 1]
+            ):
+                return None
+
+        return placed, turn
+
+    def state(self, placed, turn):
+        squares = [0] * SQUARES
+        for code, square in zip(self.codes, placed):
+            squares[square] = code
+        return BoardState.fromSquares(squares, turn)
+
+
+def _unmoveOrigins(state, square):
+    """
+    Squares the piece on the given square may have come from with a move which
+    is not a capture, a superset which is confirmed by the forward rules
+    """
+    code = state.squares[square]
+    pieceType = abs(code)
+    squares = state.squares
+
+    if pieceType in (CHARIOT, CANNON):
+        for ray in RAYS[square]:
+            for other in ray:
+                if squares[other]:
+                    break
+                yield other
+
+    elif pieceType == HORSE:
+        for origin, _ in HORSE_ORIGINS[square]:
+            if not squares[origin]:
+                yield origin
+
+    elif pieceType == ELEPHANT:
+        for origin in ELEPHANT_ORIGINS[square]:
+            if not squares[origin]:
+                yield origin
+
+    elif pieceType == ADVISOR:
+        for origin in DIAGONALS[square]:
+            if not squares[origin]:
+                yield origin
+
+    else:  # Lords and soldiers take one step along a line
+        for ray in RAYS[square]:
+            if ray and not squares[ray[0]]:
+                yield ray[0]
+
+
+def predecessors(state):
+    """
+    Get the positions one move before the given one, which lead to it without a
+    capture, as new states
+    """
+    mover = otherSide(state.turn)
+    sign = 1 if mover == RED_SIDE else -1
+    result = []
+
+    for square in list(state.pieceSquares[mover]):
+        code = state.squares[square]
+        placements = PLACEMENTS.get(code)
+        for origin in list(_unmoveOrigins(state, square)):
+            if placements is not None and origin not in placements:
+                continue
+
+            previous = state.copy()
+            # Playing the move from square to origin for the mover puts the piece
+            # back, and the turn back to the mover
+            previous.setTurn(mover)
+            previous.makeMove(square, origin)
+            previous.setTurn(mover)
+
+            if square not in PIECE_CLASSES[code * sign].generateMoves(
+                previous, origin, mover
+            ):
+                continue
+            if isInCheck(previous, otherSide(mover)):
+                continue
+
+            result.append(previous)
+
+    return result
+
+
+class Tablebase:
+    """
+    Tables of the signatures in a directory, opened through mmap the first time
+    a position of their material is probed
+    """
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        # Signature name -> (TableIndex, mmap), None if there is no such table
+        self.tables = {}
+
+    def table(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, f"{name}.xqt")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, _, size = HEADER.unpack_from(data)
+                if magic != MAGIC:
+                    raise ValueError(f"{path} is not a tablebase file")
+                self.tables[name] = (TableIndex(parseSignature(name)), data)
+            else:
+                self.tables[name] = None
+        return self.tables[name]
+
+    def probe(self, state):
+        """
+        Get the exact (result, plies to mate) of a position for the side to move,
+        None if no table covers its material
+        """
+        name = signatureOf(state)
+        table = self.table(name)
+        if table is None:
+            # The same material with the colours swapped
+            state = mirrorState(state)
+            table = self.table(signatureOf(state))
+            if table is None:
+                return None
+
+        index, data = table
+        offset = HEADER.size + index.index(state) * VALUE.size
+        value = VALUE.unpack_from(data, offset)[0]
+        if value == INVALID:
+            return None
+        return decodeValue(value)
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table[1].close()
+        self.tables = {}
+
+
+def subSignatures(codes):
+    """
+    Signatures left after one of the pieces other than the lords is captured
+    """
+    return sorted({_removeOne(codes, code) for code in codes if abs(code) != LORD})
+
+
+def _removeOne(codes, code):
+    slot = codes.index(code)
+    return codes[:slot] + codes[slot + 1 :]
+
+
+def generate(codes, solved=None, log=print):
+    """
+    Solve every position of a signature by retrograde analysis
+    Captures lead to smaller signatures, which are solved first
+    solved: values of the tables already solved by their codes, the new ones are
+    added to it
+    Return the values of the table as an array of 16 bits integers
+    """
+    solved = {} if solved is None else solved
+    if codes in solved:
+        return solved[codes]
+
+    for subCodes in subSignatures(codes):
+        generate(subCodes, solved, log)
+    subIndexes = {subCodes: TableIndex(subCodes) for subCodes in subSignatures(codes)}
+
+    startTime = time.perf_counter()
+    tableIndex = TableIndex(codes)
+    size = tableIndex.size
+
+    values = array("h", [INVALID]) * size
+    decided = bytearray(size)
+    # Moves of every position which are not captures and are not decided yet
+    remaining = array("H", bytes(2 * size))
+    # Longest of the decided moves of every position which lose
+    longestLoss = array("H", bytes(2 * size))
+    # Positions with a capture which does not lose, they can never be lost
+    notLost = bytearray(size)
+    # (index, value) of positions whose value becomes known at a distance to mate
+    pending = {}
+
+    # Forward pass: every valid position with the number of its moves, and the
+    # results of its captures from the smaller tables
+    for index in range(size):
+        decoded = tableIndex.decode(index)
+        if decoded is None:
+            continue
+        state = tableIndex.state(*decoded)
+        if isInCheck(state, otherSide(state.turn)):
+            continue
+
+        values[index] = 0
+        quiet = 0
+        for fromSq, toSq in generateLegalMoves(state):
+            if not state.squares[toSq]:
+                quiet += 1
+                continue
+
+            record = state.makeMove(fromSq, toSq)
+            subCodes = _removeOne(codes, record[2])
+            value = solved[subCodes][subIndexes[subCodes].index(state)]
+            state.unmakeMove(record)
+
+            result, plies = decodeValue(value)
+            if result == LOSS:
+                notLost[index] = 1
+                pending.setdefault(plies + 1, []).append((index, winValue(plies + 1)))
+            elif result == DRAW:
+                notLost[index] = 1
+            else:
+                longestLoss[index] = max(longestLoss[index], plies + 1)
+
+        remaining[index] = quiet
+        if not quiet and not notLost[index]:
+            # Every move is a losing capture, or there is no move left at all,
+            # which is a loss in chinese chess, stalemate included
+            plies = longestLoss[index]
+            pending.setdefault(plies, []).append((index, lossValue(plies)))
+
+    forwardTime = time.perf_counter() - startTime
+
+    # Backward pass, from the positions closest to the mate
+    level = 0
+    while pending:
+        for index, value in pending.pop(level, ()):
+            if decided[index]:
+                continue
+            values[index] = value
+            decided[index] = 1
+
+            for previous in predecessors(tableIndex.state(*tableIndex.decode(index))):
+                previousIndex = tableIndex.index(previous)
+                if decided[previousIndex]:
+                    continue
+
+                if value < 0:
+                    # A move to a lost position wins
+                    pending.setdefault(level + 1, []).append(
+                        (previousIndex, winValue(level + 1))
+                    )
+                    continue
+
+                remaining[previousIndex] -= 1
+                longestLoss[previousIndex] = max(longestLoss[previousIndex], level + 1)
+                if not remaining[previousIndex] and not notLost[previousIndex]:
+                    plies = longestLoss[previousIndex]
+                    pending.setdefault(plies, []).append(
+                        (previousIndex, lossValue(plies))
+                    )
+
+        level += 1
+
+    log(
+        f"{signatureName(codes)}: {size} indices, forward {forwardTime:.1f}s, "
+        f"backward {time.perf_counter() - startTime - forwardTime:.1f}s, "
+        f"longest mate {max(level - 1, 0)} plies"
+    )
+
+    solved[codes] = values
+    return values
+
+
+def writeTable(directory, codes, values):
+    """
+    Write the values of a table to its file in the directory
+    """
+    name = signatureName(codes)
+    data = array("h", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+
+    with open(os.path.join(directory, f"{name}.xqt"), "wb") as f:
+        f.write(HEADER.pack(MAGIC, name.encode(), len(data)))
+        f.write(data.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endgame tablebases")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser(
+        "generate", help="solve a signature and the smaller ones it leads to"
+    )
+    build.add_argument("signature", help="red pieces-blue pieces, such as KR-KAA")
+    build.add_argument("--dir", default=TABLEBASE_DIR)
+
+    probe = commands.add_parser("probe", help="look up a position")
+    probe.add_argument("fen")
+    probe.add_argument("--dir", default=TABLEBASE_DIR)
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        os.makedirs(args.dir, exist_ok=True)
+        solved = {}
+        generate(parseSignature(args.signature), solved)
+        for codes, values in solved.items():
+            writeTable(args.dir, codes, values)
+        return 0
+
+    result = Tablebase(args.dir).probe(BoardState.fromFen(args.fen))
+    if result is None:
+        print("no table for this material")
+    else:
+        outcome, plies = result
+        names = {WIN: "win", DRAW: "draw", LOSS: "loss"}
+        print(names[outcome] + (f" in {plies} plies" if plies is not None else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
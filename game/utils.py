@@ -1,15 +1,20 @@
-import pygame
-
-pygame.font.init()
+import os
 
 # Width and height of the application
 WIN_WIDTH = 1200
 WIN_HEIGHT = 900
 
+# Address of the room server, see game/roomServer.py
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
 # Red side, blue side indicator
 RED_SIDE = RED_TURN = 1
 BLUE_SIDE = BLUE_TURN = 0
 
+# Fonts and images are found from the project folder, not the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 class Color:
     RED = (255, 0, 0)
@@ -24,26 +29,60 @@ class Color:
     TURQUOISE = (64, 224, 208)
 
 
+def _loadFont(fileName, size, bold=False):
+    import pygame
+
+    pygame.font.init()
+    font = pygame.font.Font(os.path.join(ROOT_DIR, "fonts", fileName), size)
+    font.set_bold(bold)
+    return font
+
+
+def _loadImage(fileName):
+    import pygame
+
+    return pygame.image.load(os.path.join(ROOT_DIR, "images", "pieces", fileName))
+
+
+class LazyAsset:
+    """
+    Class attribute which loads its asset the first time it is used
+    pygame is only imported then, so the rules and the game logic never need it
+    """
+
+    def __init__(self, load, *args, **kwargs):
+        self.load = load
+        self.args = args
+        self.kwargs = kwargs
+        self.asset = None
+
+    def __get__(self, instance, owner):
+        if self.asset is None:
+            self.asset = self.load(*self.args, **self.kwargs)
+        return self.asset
+
+
 class Font:
-    SCORE_TEXT_FONT = pygame.font.Font("./fonts/CursedTimerUlil-Aznm.ttf", 30)
-    SCORE_FONT = pygame.font.Font("./fonts/CursedTimerUlil-Aznm.ttf", 30, bold=True)
-    NORMAL_FONT = pygame.font.Font("./fonts/Poppins-Bold.ttf", 30)
-    WRITING_FONT = pygame.font.Font("./fonts/Allison-Regular.ttf", 30)
+    SCORE_TEXT_FONT = LazyAsset(_loadFont, "CursedTimerUlil-Aznm.ttf", 30)
+    SCORE_FONT = LazyAsset(_loadFont, "CursedTimerUlil-Aznm.ttf", 30, bold=True)
+    NORMAL_FONT = LazyAsset(_loadFont, "Poppins-Bold.ttf", 30)
+    WRITING_FONT = LazyAsset(_loadFont, "Allison-Regular.ttf", 30)
+    STATS_FONT = LazyAsset(_loadFont, "CursedTimerUlil-Aznm.ttf", 14)
 
 
 class ChessImages:
-    RED_CHARIOT = pygame.image.load("./images/pieces/red-car.png")
-    RED_CANNON = pygame.image.load("./images/pieces/red-cannon.png")
-    RED_HORSE = pygame.image.load("./images/pieces/red-horse.png")
-    RED_ELEPHANT = pygame.image.load("./images/pieces/red-elephant.png")
-    RED_SOLDIER = pygame.image.load("./images/pieces/red-pawn.png")
-    RED_ADVISOR = pygame.image.load("./images/pieces/red-bodyguard.png")
-    RED_LORD = pygame.image.load("./images/pieces/red-king.png")
-
-    BLUE_CHARIOT = pygame.image.load("./images/pieces/blue-car.png")
-    BLUE_CANNON = pygame.image.load("./images/pieces/blue-cannon.png")
-    BLUE_HORSE = pygame.image.load("./images/pieces/blue-horse.png")
-    BLUE_ELEPHANT = pygame.image.load("./images/pieces/blue-elephant.png")
-    BLUE_SOLDIER = pygame.image.load("./images/pieces/blue-pawn.png")
-    BLUE_ADVISOR = pygame.image.load("./images/pieces/blue-bodyguard.png")
-    BLUE_LORD = pygame.image.load("./images/pieces/blue-king.png")
+    RED_CHARIOT = LazyAsset(_loadImage, "red-car.png")
+    RED_CANNON = LazyAsset(_loadImage, "red-cannon.png")
+    RED_HORSE = LazyAsset(_loadImage, "red-horse.png")
+    RED_ELEPHANT = LazyAsset(_loadImage, "red-elephant.png")
+    RED_SOLDIER = LazyAsset(_loadImage, "red-pawn.png")
+    RED_ADVISOR = LazyAsset(_loadImage, "red-bodyguard.png")
+    RED_LORD = LazyAsset(_loadImage, "red-king.png")
+
+    BLUE_CHARIOT = LazyAsset(_loadImage, "blue-car.png")
+    BLUE_CANNON = LazyAsset(_loadImage, "blue-cannon.png")
+    BLUE_HORSE = LazyAsset(_loadImage, "blue-horse.png")
+    BLUE_ELEPHANT = LazyAsset(_loadImage, "blue-elephant.png")
+    BLUE_SOLDIER = LazyAsset(_loadImage, "blue-pawn.png")
+    BLUE_ADVISOR = LazyAsset(_loadImage, "blue-bodyguard.png")
+    BLUE_LORD = LazyAsset(_loadImage, "blue-king.png")
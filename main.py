@@ -1,63 +1,175 @@
+import argparse
+import os
+import sys
+
 import pygame
 
-from game.utils import Color, WIN_HEIGHT, WIN_WIDTH
+from game.utils import ROOT_DIR, WIN_HEIGHT, WIN_WIDTH
 from game.controlPanel import ControlPanel
+from game.engine import EngineWorker
 from game.game import Game
-
+from game.position import toPosition
+from game.render import FrameRenderer
 
 # Increase sharpness
-import ctypes
+if sys.platform == "win32":
+    import ctypes
 
-ctypes.windll.shcore.SetProcessDpiAwareness(1)
+    ctypes.windll.shcore.SetProcessDpiAwareness(1)
 
 # Window's Configuration
 WIN_WIDTH = WIN_WIDTH  # height and width of window
 WIN_HEIGHT = WIN_HEIGHT
 
-WIN = pygame.display.set_mode(
-    (WIN_WIDTH, WIN_HEIGHT), pygame.RESIZABLE
-)  # initilize win form
-pygame.display.set_caption("Chinese Chess Game")  # win caption
+# Every game played is kept in this file, see game/record.py
+RECORD_PATH = os.path.join(ROOT_DIR, "records", "games.xqr")
+# Opening book built from the records, see game/book.py
+BOOK_PATH = os.path.join(ROOT_DIR, "records", "book.xqb")
+
+# Frames per second while something is moving on the screen
+FPS = 60
+# How often to look for the move of the engine while it is thinking, or for
+# messages of the room server while playing online, in ms
+POLL_INTERVAL = 50
+# Key showing or hiding the move statistics, see game/stats.py
+STATS_KEY = pygame.K_F3
+# File the cProfile capture of --profile is saved to
+PROFILE_PATH = "moves.prof"
+
 pygame.font.init()
 myfont = pygame.font.SysFont("Comic Sans MS", 15)
 
 
-def draw(game, controlPanel):
+def draw(renderer, game, controlPanel):
     """
-    Drawing the game to window
+    Drawing the game to window, only the parts which changed are pushed to the screen
     """
-    WIN.fill(Color.BLACK)
-    game.updateGame()
+    renderer.draw(game, controlPanel)
 
-    controlPanel.draw(WIN)
-    pygame.display.update()
+
+def playComputerMove(game, engine):
+    """
+    Ask the engine process for a move when it is the computer's turn,
+    and play it once the search is done
+    Return True if a move was played or a search ended, the window then has to
+    be drawn again before waiting for events
+    """
+    if not game.isComputerTurn():
+        return False
+
+    # Play from the opening book as long as the position is in it
+    bookMove = game.bookMove()
+    if bookMove is not None and not engine.thinking:
+        game.playMove(*bookMove)
+        return True
+
+    result = engine.poll()
+    if result is not None:
+        # Ignore searches of a position which is not on the board anymore
+        if result.key == game.board.positionKey() and result.move is not None:
+            fromSquare, toSquare = result.move
+            game.lastSearch = result
+            game.playMove(toPosition(fromSquare), toPosition(toSquare))
+        return True
+
+    if not engine.thinking:
+        engine.search(game.board.state)
+    return False
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Play Chinese chess")
+    parser.add_argument(
+        "--stats",
+        metavar="PATH",
+        help="append the statistics of every move to a JSON lines file",
+    )
+    parser.add_argument(
+        "--profile",
+        type=int,
+        metavar="MOVES",
+        help=f"profile the next moves with cProfile, saved to {PROFILE_PATH}",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="record the peak memory of every move",
+    )
+    return parser.parse_args()
 
 
 def main():
     """
     Main function
     """
-
-    game = Game(WIN)
+    args = parseArgs()
+
+    # The window is made here, so the engine process does not open one
+    # when it imports this module
+    win = pygame.display.set_mode(
+        (WIN_WIDTH, WIN_HEIGHT), pygame.RESIZABLE
+    )  # initilize win form
+    pygame.display.set_caption("Chinese Chess Game")  # win caption
+
+    game = Game(win)
+    game.recordPath = RECORD_PATH
+    if args.trace_memory:
+        game.stats.traceMemory()
+    if args.profile:
+        game.stats.profile(args.profile, PROFILE_PATH)
+    if os.path.exists(BOOK_PATH):
+        game.openBook(BOOK_PATH)
     controlPanel = ControlPanel(game)
+    renderer = FrameRenderer(win)
+    engine = EngineWorker()
+
+    clock = pygame.time.Clock()
 
     run = True
     while run:
-        draw(game, controlPanel)
-        # Loop through all events in 1 frames
-        for event in pygame.event.get():
+        draw(renderer, game, controlPanel)
+        computerMoved = playComputerMove(game, engine)
+        networkChanged = game.pollNetwork()
+
+        board = game.board
+        if computerMoved or networkChanged:
+            # Draw what changed before waiting for the player
+            events = pygame.event.get()
+        elif board.redLord.mated or board.blueLord.mated:
+            # The ring around a lord under attack is animated
+            clock.tick(FPS)
+            events = pygame.event.get()
+        elif engine.thinking or game.client is not None:
+            events = [pygame.event.wait(POLL_INTERVAL)] + pygame.event.get()
+        else:
+            # Nothing changes on the screen until the player does something
+            events = [pygame.event.wait()] + pygame.event.get()
+
+        for event in events:
             if event.type == pygame.QUIT:
                 run = False
                 break
 
-            pos = pygame.mouse.get_pos()
-            if pygame.mouse.get_pressed()[0]:
+            if event.type in (pygame.VIDEORESIZE, pygame.VIDEOEXPOSE):
+                renderer.invalidate()
+
+            elif event.type == pygame.KEYDOWN and event.key == STATS_KEY:
+                game.stats.visible = not game.stats.visible
+
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 if not game.isOver:
-                    game.checkForMove(pos)
+                    if not game.isComputerTurn() and not game.isRemoteTurn():
+                        game.checkForMove(event.pos)
                 else:
                     print("Game is over")
 
-                controlPanel.checkForClick(pos)
+                controlPanel.checkForClick(event.pos)
+
+    game.saveGame()
+    game.leaveRoom()
+    if args.stats:
+        game.stats.exportJson(args.stats)
+    engine.stop()
 
 
 if __name__ == "__main__":